@@ -0,0 +1,116 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import check_repo
+import fake_gitlab
+import instrumentation
+
+
+# Runs timed per scenario: 'cold' starts from an empty working folder, 'warm' reruns with the
+# downloads, results and HTTP cache of the cold run, 'push' reruns after some students pushed
+BENCHMARK_PHASES = ['cold', 'warm', 'push']
+
+
+# Function to time one run_batch call against the fake server, with its log discarded
+def time_run(server, participants_file, assignment, workers, **options):
+    server.reset_counters()
+    instrumentation.STATS.reset()
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        results = check_repo.run_batch(participants_file, assignment, workers=workers, **options)
+    wall = time.perf_counter() - start
+    summary = instrumentation.STATS.summary()
+    return {
+        'wall': wall,
+        'errors': sum(1 for result in results if result['status'] != 'ok'),
+        'requests': sum(server.requests.values()),
+        'requests_by_endpoint': dict(sorted(server.requests.items())),
+        'bytes_sent': server.bytes_sent,
+        'stages': {row['stage']: round(row['wall'], 4) for row in summary['stages'] if row['stage']},
+    }
+
+# Function to run every phase of one scenario in a fresh working folder and return its timings
+def run_scenario(participants, assignment, workers=1, latency=0.0, push_fraction=0.25, http_cache_dir='.http-cache',
+                 download_mode='archive', backend='rest', seed=0, **fixture_options):
+    server = fake_gitlab.FakeGitLab(participants, assignment, latency=latency, seed=seed, **fixture_options)
+    url = server.start()
+    workdir = tempfile.mkdtemp(prefix='grading-benchmark-')
+    previous_dir, previous_url = os.getcwd(), check_repo.GITLAB_URL
+    try:
+        os.chdir(workdir)
+        check_repo.GITLAB_URL = url
+        with open('participants.txt', 'w') as f:
+            f.write('\n'.join(participants) + '\n')
+
+        phases = {}
+        for phase in BENCHMARK_PHASES:
+            if phase == 'push':
+                pushed = participants[:max(int(len(participants) * push_fraction), 1)]
+                for username in pushed:
+                    server.projects[f'{username}-cse262/{assignment}'].push(count=2)
+            phases[phase] = time_run(server, 'participants.txt', assignment, workers, http_cache_dir=http_cache_dir,
+                                     download_mode=download_mode, backend=backend)
+        return phases
+    finally:
+        os.chdir(previous_dir)
+        check_repo.GITLAB_URL = previous_url
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# Function to print one line per scenario and phase, then the slowest stages of each phase
+def print_report(report):
+    print(f"{'scenario':<28} {'phase':<6} {'wall s':>8} {'s/student':>10} {'requests':>9} {'MB sent':>8} {'errors':>7}")
+    for name, scenario in report['scenarios'].items():
+        for phase, timing in scenario.items():
+            per_student = timing['wall'] / report['config']['students']
+            print(f"{name:<28} {phase:<6} {timing['wall']:>8.2f} {per_student:>10.3f} {timing['requests']:>9} "
+                  f"{timing['bytes_sent'] / 2**20:>8.2f} {timing['errors']:>7}")
+    for name, scenario in report['scenarios'].items():
+        print(f"\n{name}: slowest stages (summed over students)")
+        for phase, timing in scenario.items():
+            stages = sorted(timing['stages'].items(), key=lambda item: -item[1])[:5]
+            print(f"  {phase:<6} " + ', '.join(f'{stage} {wall:.2f}s' for stage, wall in stages if stage != 'total'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time check_repo.py against a local fake GitLab server serving generated submissions.")
+    parser.add_argument('--students', type=int, default=20, help="roster size")
+    parser.add_argument('--assignment', default='homework-3', help="assignment name of the generated projects")
+    parser.add_argument('--files', type=int, default=40, help="files per repository")
+    parser.add_argument('--file-size', type=int, default=2048, help="bytes per generated source file")
+    parser.add_argument('--commits', type=int, default=30, help="commits per repository")
+    parser.add_argument('--tests', type=int, default=25, help="tests in each job trace")
+    parser.add_argument('--trace-kb', type=int, default=64, help="approximate size of each job trace")
+    parser.add_argument('--latency-ms', type=float, default=20, help="delay the server adds to every request")
+    parser.add_argument('--workers', default='1,8', help="comma-separated worker counts, one scenario each")
+    parser.add_argument('--download-mode', choices=['archive', 'files'], default='archive')
+    parser.add_argument('--no-http-cache', action='store_true', help="run without the GitLab response cache")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the generated fixtures")
+    parser.add_argument('--json', metavar='PATH', help="also write the full report as JSON")
+    args = parser.parse_args()
+
+    participants = [f'student{index:03d}' for index in range(args.students)]
+    config = {key: value for key, value in vars(args).items() if key != 'json'}
+    report = {'config': config, 'scenarios': {}}
+    for workers in [int(count) for count in args.workers.split(',')]:
+        name = f'{args.download_mode}, {workers} worker(s)'
+        report['scenarios'][name] = run_scenario(
+            participants, args.assignment, workers=workers, latency=args.latency_ms / 1000,
+            http_cache_dir=None if args.no_http_cache else '.http-cache', download_mode=args.download_mode,
+            seed=args.seed, files=args.files, file_size=args.file_size, commits=args.commits, tests=args.tests,
+            trace_kb=args.trace_kb)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,492 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import instrumentation
+import results_store
+import result_cache
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; limits are then skipped
+    resource = None
+
+
+# Per-student limits, so one student's infinite loop or runaway allocation
+# cannot hold up or take down the whole class
+CARGO_TIMEOUT = 300          # wall-clock seconds for build + tests
+CARGO_CPU_SECONDS = 600      # CPU seconds per process (cargo, rustc, test binary)
+CARGO_MEMORY_MB = 4096       # address space per process
+
+# Written by check_repo.py under the download folder: which commit each local folder holds
+DOWNLOAD_MANIFEST_NAME = '.download-manifest.json'
+
+# Build cache shared by all submissions of an assignment: one pre-built target directory per
+# dependency fingerprint and one vendored copy of the crate registry
+CARGO_CACHE_DIR = 'cargo-cache'
+
+# Cargo.toml tables that decide which crates get compiled, e.g. [dependencies], [dev-dependencies.foo]
+DEPENDENCY_SECTION_PATTERN = re.compile(r"^\[(?:target\..+\.)?(?:dev-|build-)?dependencies(?:\..+)?\]$")
+
+# Outcomes that are final for a commit; timeouts and runner errors are retried by a resumed run
+FINAL_STATUSES = ('ok', 'failed', 'crashed', 'build-error')
+
+# Outcomes the test result cache keeps. A build error or crash can also come from the machine
+# (registry or network failure, rustc at the memory limit, a full disk), and caching it would
+# stick to that tree and every identical submission, so those are always run again
+CACHED_STATUSES = ('ok', 'failed')
+
+# cargo/rustc output of a crate that did not compile, as opposed to a run that failed for another reason
+COMPILE_ERROR_PATTERN = re.compile(r"could not compile|^error\[E\d+\]", re.MULTILINE)
+
+# cargo's line for each crate that failed to build, e.g. "error: could not compile `grading` (lib test) due to ..."
+FAILED_CRATE_PATTERN = re.compile(r"could not compile `([^`]+)`")
+
+# The name key of the [package] table in Cargo.toml
+PACKAGE_NAME_PATTERN = re.compile(r"""^name\s*=\s*["']([^"']+)["']""")
+
+# One line per test binary, e.g. "test result: FAILED. 3 passed; 1 failed; 0 ignored; ..."
+TEST_RESULT_PATTERN = re.compile(r"test result: (?:ok|FAILED)\. (\d+) passed; (\d+) failed")
+
+# One line per test case, e.g. "test lexer::numbers ... ok", with "<0.012s>" when run with --report-time
+TEST_CASE_PATTERN = re.compile(r"^test (.+?) \.\.\. (ok|FAILED|ignored)(?: <(\d+(?:\.\d+)?)s>)?", re.MULTILINE)
+
+
+# Function to count the available cores, respecting CPU affinity where supported
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# Function to apply the CPU and memory limits inside the child process, before cargo starts
+def limit_resources(cpu_seconds, memory_mb):
+    def apply():
+        # New process group, so a timeout can kill cargo together with the test binaries it started
+        os.setsid()
+        if resource is None:
+            return
+        if cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+        if memory_mb:
+            memory_bytes = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    return apply
+
+# Function to run one command under the per-student limits, in its own process group so that a
+# timeout kills everything it started. Returns (returncode, stdout, stderr); the return code is
+# None when the command timed out. Raises OSError when the command cannot be started
+def run_limited(command, cwd=None, env=None, timeout=CARGO_TIMEOUT, cpu_seconds=CARGO_CPU_SECONDS,
+                memory_mb=CARGO_MEMORY_MB):
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                               errors='replace',
+                               preexec_fn=limit_resources(cpu_seconds, memory_mb) if os.name == 'posix' else None)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+        return process.returncode, stdout, stderr
+    except subprocess.TimeoutExpired:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        stdout, stderr = process.communicate()
+        return None, stdout, stderr
+
+# Function to add up the "test result:" lines of every test binary in cargo's output
+def parse_cargo_test_output(output):
+    passed_tests = 0
+    failed_tests = 0
+    found = False
+    for match in TEST_RESULT_PATTERN.finditer(output):
+        passed_tests += int(match.group(1))
+        failed_tests += int(match.group(2))
+        found = True
+    if not found:
+        return None
+    return passed_tests + failed_tests, passed_tests, failed_tests
+
+# Function to list the (name, outcome, seconds) of every test case in cargo test output
+def parse_test_cases(output):
+    return [(name, outcome, float(seconds) if seconds else None)
+            for name, outcome, seconds in TEST_CASE_PATTERN.findall(output)]
+
+# Function to hash the parts of Cargo.toml that determine the compiled dependencies, plus the
+# crate versions a committed Cargo.lock pins. Submissions with the same fingerprint can start
+# from the same pre-built target directory and are covered by the same vendored crates
+def dependency_fingerprint(folder_path):
+    manifest = os.path.join(folder_path, 'Cargo.toml')
+    if not os.path.isfile(manifest):
+        return None
+    digest = hashlib.sha256()
+    in_dependencies = False
+    with open(manifest, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith('['):
+                in_dependencies = bool(DEPENDENCY_SECTION_PATTERN.match(line))
+            if in_dependencies or line.startswith('edition'):
+                digest.update(line.encode() + b'\n')
+    lock_file = os.path.join(folder_path, 'Cargo.lock')
+    if os.path.isfile(lock_file):
+        with open(lock_file, encoding='utf-8', errors='replace') as f:
+            # Only registry and git packages; the student's own crate does not change the dependencies
+            for package in f.read().split('[[package]]'):
+                if 'source = ' in package:
+                    digest.update(package.strip().encode() + b'\n')
+    return digest.hexdigest()[:16]
+
+# Function to read the [package] name of a Cargo.toml, or None if it has none
+def package_name(folder_path):
+    in_package = False
+    try:
+        with open(os.path.join(folder_path, 'Cargo.toml'), encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line.startswith('['):
+                    in_package = line == '[package]'
+                elif in_package:
+                    match = PACKAGE_NAME_PATTERN.match(line)
+                    if match:
+                        return match.group(1)
+    except OSError:
+        pass
+    return None
+
+# Function to download every crate the submissions need once, into a vendor directory.
+# Returns the cargo --config arguments that make later builds use it offline
+def vendor_dependencies(manifests, vendor_dir, timeout=CARGO_TIMEOUT, cpu_seconds=CARGO_CPU_SECONDS,
+                        memory_mb=CARGO_MEMORY_MB):
+    if not manifests:
+        return []
+    command = ['cargo', 'vendor', '--quiet', '--manifest-path', manifests[0]]
+    for manifest in manifests[1:]:
+        command += ['--sync', manifest]
+    command.append(vendor_dir)
+    try:
+        returncode, _, stderr = run_limited(command, timeout=timeout, cpu_seconds=cpu_seconds, memory_mb=memory_mb)
+    except OSError as e:
+        returncode, stderr = -1, str(e)
+    if returncode != 0:
+        reason = f"timed out after {timeout}s" if returncode is None else stderr.strip()
+        print(f"Failed to vendor dependencies, builds will use the registry: {reason}")
+        return []
+    return ['--offline',
+            '--config', 'source.crates-io.replace-with="vendored-sources"',
+            '--config', f'source.vendored-sources.directory="{os.path.abspath(vendor_dir)}"']
+
+# Function to build the dependencies of one representative submission into a seed target directory.
+# This compiles the student's build script and crate, so it runs under the same limits as their tests
+def build_seed(folder_path, seed_dir, cargo_args, timeout=CARGO_TIMEOUT, cpu_seconds=CARGO_CPU_SECONDS,
+               memory_mb=CARGO_MEMORY_MB):
+    if os.path.exists(os.path.join(seed_dir, '.complete')):
+        return True
+    shutil.rmtree(seed_dir, ignore_errors=True)
+    env = dict(os.environ, CARGO_TARGET_DIR=seed_dir)
+    try:
+        returncode, _, stderr = run_limited(['cargo', 'test', '--no-run', *cargo_args], cwd=folder_path, env=env,
+                                            timeout=timeout, cpu_seconds=cpu_seconds, memory_mb=memory_mb)
+    except OSError as e:
+        returncode, stderr = -1, str(e)
+    if returncode is None:
+        print(f"Building the dependency cache from {folder_path} timed out after {timeout}s")
+        shutil.rmtree(seed_dir, ignore_errors=True)
+        return False
+    # A compile error in the student's own crate still leaves the dependencies built, which is all the
+    # seed is for. Any other failure (a dependency hitting the limits, a registry error) leaves a partial
+    # seed that every later run with this fingerprint would reuse, so it is removed
+    if returncode != 0:
+        failed_crates = set(FAILED_CRATE_PATTERN.findall(stderr))
+        if not failed_crates or failed_crates != {package_name(folder_path)}:
+            print(f"Failed to build the dependency cache from {folder_path}: {stderr.strip()[-2000:]}")
+            shutil.rmtree(seed_dir, ignore_errors=True)
+            return False
+    if not os.path.isdir(seed_dir):
+        print(f"Failed to build the dependency cache from {folder_path}: no target directory was created")
+        return False
+    open(os.path.join(seed_dir, '.complete'), 'w').close()
+    return True
+
+# Function to prepare the shared build cache for an assignment. Dependencies are vendored once and
+# built once per fingerprint; returns the seed directory of each folder and the extra cargo arguments
+def prepare_build_cache(assignment, folders, cache_dir=CARGO_CACHE_DIR, vendor=True, timeout=CARGO_TIMEOUT,
+                        cpu_seconds=CARGO_CPU_SECONDS, memory_mb=CARGO_MEMORY_MB):
+    limits = {'timeout': timeout, 'cpu_seconds': cpu_seconds, 'memory_mb': memory_mb}
+    assignment_cache = os.path.abspath(os.path.join(cache_dir, assignment))
+    os.makedirs(assignment_cache, exist_ok=True)
+
+    representatives = {}
+    fingerprints = {}
+    for folder in folders:
+        fingerprint = dependency_fingerprint(folder)
+        fingerprints[folder] = fingerprint
+        if fingerprint is not None:
+            representatives.setdefault(fingerprint, folder)
+    print(f"{len(representatives)} distinct dependency set(s) across {len(folders)} submission(s)")
+
+    cargo_args = []
+    if vendor:
+        manifests = [os.path.join(folder, 'Cargo.toml') for folder in representatives.values()]
+        cargo_args = vendor_dependencies(manifests, os.path.join(assignment_cache, 'vendor'), **limits)
+
+    seeds = {}
+    for fingerprint, folder in representatives.items():
+        seed_dir = os.path.join(assignment_cache, f'target-{fingerprint}')
+        if build_seed(folder, seed_dir, cargo_args, **limits):
+            seeds[fingerprint] = seed_dir
+
+    return {folder: seeds.get(fingerprint) for folder, fingerprint in fingerprints.items()}, cargo_args
+
+# Function to start a submission's own target directory from the pre-built seed. Each job keeps a
+# private copy, because parallel builds sharing one target directory would wait on cargo's lock
+def seed_target_dir(folder_path, seed_dir):
+    target_dir = os.path.join(folder_path, 'target')
+    if seed_dir is None or os.path.exists(target_dir):
+        return
+    shutil.copytree(seed_dir, target_dir, symlinks=True, ignore=shutil.ignore_patterns('.complete'))
+
+# Function to run `cargo test` in one student folder. The folder is passed as cwd=,
+# never via os.chdir, so many of these can run at the same time
+def run_cargo_test(folder_path, timeout=CARGO_TIMEOUT, cpu_seconds=CARGO_CPU_SECONDS, memory_mb=CARGO_MEMORY_MB,
+                   env=None, seed_dir=None, cargo_args=(), report_time=False):
+    result = {
+        'folder': folder_path,
+        'status': 'error',
+        'total_tests': 0,
+        'passed_tests': 0,
+        'failed_tests': 0,
+        'tests': [],
+        'returncode': None,
+        'stdout': '',
+        'stderr': '',
+        'duration': 0.0,
+    }
+    # Each job builds and tests on one core; the pool supplies the parallelism
+    job_env = dict(os.environ if env is None else env)
+    job_env.setdefault('CARGO_BUILD_JOBS', '1')
+    job_env.setdefault('RUST_TEST_THREADS', '1')
+    test_args = []
+    if report_time:
+        # libtest takes -Z options only on nightly or with RUSTC_BOOTSTRAP set; the value -1 keeps
+        # rustc itself on stable, so student code still cannot enable unstable features
+        job_env['RUSTC_BOOTSTRAP'] = '-1'
+        test_args = ['--', '-Z', 'unstable-options', '--report-time']
+
+    start = time.time()
+    try:
+        seed_target_dir(folder_path, seed_dir)
+        # --no-fail-fast runs every test binary, so one that crashes does not hide the results of the others
+        result['returncode'], result['stdout'], result['stderr'] = run_limited(
+            ['cargo', 'test', '--no-fail-fast', *cargo_args, *test_args], cwd=folder_path, env=job_env, timeout=timeout,
+            cpu_seconds=cpu_seconds, memory_mb=memory_mb)
+    except OSError as e:
+        result['stderr'] = str(e)
+        return result
+    result['duration'] = time.time() - start
+
+    if result['returncode'] is None:
+        result['status'] = 'timeout'
+        return result
+
+    counts = parse_cargo_test_output(result['stdout'])
+    if counts is not None:
+        result['total_tests'], result['passed_tests'], result['failed_tests'] = counts
+        result['tests'] = parse_test_cases(result['stdout'])
+
+    if result['returncode'] == 0:
+        result['status'] = 'ok'
+    elif COMPILE_ERROR_PATTERN.search(result['stderr']):
+        result['status'] = 'build-error'
+    elif result['failed_tests']:
+        result['status'] = 'failed'
+    else:
+        # Non-zero exit with no failing test: a test binary aborted (stack overflow, panic in a
+        # destructor) or was killed at the CPU or memory limit, or cargo itself failed
+        result['status'] = 'crashed'
+    return result
+
+# Function to locate each student's checkout, e.g. repo/homework-1/<user>-cse262/homework-1
+def student_folders(assignment, participants, base_dir='repo'):
+    base_dir = os.path.abspath(os.path.join(base_dir, assignment))
+    return {people: os.path.normpath(os.path.join(base_dir, f'{people}-cse262', assignment))
+            for people in participants}
+
+# Function to map each downloaded folder to the commit SHA it was downloaded at
+def downloaded_commits(base_dir='repo'):
+    try:
+        with open(os.path.join(base_dir, DOWNLOAD_MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return {os.path.normpath(os.path.abspath(entry['local_dir'])): entry['sha'] for entry in manifest.values()}
+
+# Function to save the captured output of one student's run next to the class results
+def write_log(log_dir, username, result):
+    os.makedirs(log_dir, exist_ok=True)
+    with open(os.path.join(log_dir, f'{username}.log'), 'w') as f:
+        reused = ', reused from an identical submission' if result.get('cached') else ''
+        f.write(f"status: {result['status']} (exit code {result['returncode']}, {result['duration']:.1f}s{reused})\n")
+        f.write('-' * 20 + ' stdout ' + '-' * 20 + '\n')
+        f.write(result['stdout'])
+        f.write('-' * 20 + ' stderr ' + '-' * 20 + '\n')
+        f.write(result['stderr'])
+
+# Function to record one student's local result and mark the stage in the run journal as soon
+# as it is known, so a run that dies part way keeps everything finished before it
+def record_result(people, assignment, result, commit_sha, log_dir, db_path=results_store.RESULTS_DB):
+    if 'stdout' in result:
+        write_log(log_dir, people, result)
+        if not result.get('cached'):
+            instrumentation.record(people, 'local_test', wall=result['duration'], calls=1)
+    results_store.upsert_result(people, assignment, commit_sha, db_path=db_path,
+                                local_status=result['status'], local_total_tests=result['total_tests'],
+                                local_passed_tests=result['passed_tests'], local_failed_tests=result['failed_tests'])
+    results_store.record_test_cases(people, assignment, 'local', result.get('tests', []), commit_sha=commit_sha,
+                                    db_path=db_path)
+    done = result['status'] in FINAL_STATUSES
+    results_store.record_stage(people, assignment, 'local-test', 'done' if done else 'failed', commit_sha=commit_sha,
+                               error=None if done else result['status'], db_path=db_path)
+
+# Function to run cargo test for every participant of an assignment. With resume=True, students
+# whose tests already completed at the commit their folder now holds are not run again.
+# With a test cache, a submission whose tree (plus grader_files, toolchain and limits) was
+# tested before reuses that result, and identical submissions in one run are tested once
+def run_class(assignment, participants_file='participants.txt', base_dir='repo', workers=None,
+              timeout=CARGO_TIMEOUT, cpu_seconds=CARGO_CPU_SECONDS, memory_mb=CARGO_MEMORY_MB,
+              shared_cache=True, vendor=True, cache_dir=CARGO_CACHE_DIR, db_path=results_store.RESULTS_DB,
+              resume=False, result_cache_dir=result_cache.RESULT_CACHE_DIR, grader_files=(), report_time=False):
+    with open(participants_file) as f:
+        participants = [line.strip() for line in f if line.strip()]
+
+    folders = student_folders(assignment, participants, base_dir=base_dir)
+    commits = downloaded_commits(base_dir)
+    log_dir = os.path.join(base_dir, assignment, 'logs')
+    journal = results_store.read_journal(assignment, db_path=db_path) if resume else {}
+    stored = {row['student']: row for row in results_store.grade_table(assignment, db_path=db_path)} if resume else {}
+
+    results = {}
+    for people, folder in folders.items():
+        entry = journal.get(people, {}).get('local-test', {})
+        if not os.path.exists(folder):
+            print(f"{people} does not have a {assignment} folder.")
+            results[people] = {'folder': folder, 'status': 'missing', 'total_tests': 0, 'passed_tests': 0,
+                               'failed_tests': 0}
+            record_result(people, assignment, results[people], commits.get(folder), log_dir, db_path=db_path)
+        elif entry.get('status') == 'done' and entry['commit_sha'] == (commits.get(folder) or ''):
+            row = stored.get(people, {})
+            results[people] = {'folder': folder, 'status': row.get('local_status'), 'resumed': True,
+                               'total_tests': row.get('local_total_tests', 0),
+                               'passed_tests': row.get('local_passed_tests', 0),
+                               'failed_tests': row.get('local_failed_tests', 0)}
+
+    pending = [people for people in participants if people not in results]
+    if resume:
+        resumed = sum(1 for result in results.values() if result.get('resumed'))
+        print(f"Resuming {assignment}: {resumed} of {len(participants)} students already done")
+
+    cache, keys, hits = None, {}, {}
+    if result_cache_dir and pending:
+        cache = result_cache.ResultCache(result_cache_dir)
+        toolchain = result_cache.toolchain_version()
+        settings = [timeout, cpu_seconds, memory_mb, report_time]
+        with instrumentation.stage('result_cache'):
+            for people in pending:
+                keys[people] = result_cache.submission_key(folders[people], toolchain, settings, grader_files)
+                cached = cache.load(keys[people])
+                if cached is not None:
+                    hits[people] = dict(cached, folder=folders[people], cached=True)
+        for people, result in hits.items():
+            results[people] = result
+            record_result(people, assignment, result, commits.get(folders[people]), log_dir, db_path=db_path)
+        pending = [people for people in pending if people not in hits]
+
+    # Students with the same key share one run; without a cache every student is its own group
+    groups = {}
+    for people in pending:
+        groups.setdefault(keys.get(people, people), []).append(people)
+    if cache:
+        print(f"Test cache: {len(hits)} submission(s) reused, {len(pending)} to test in {len(groups)} distinct tree(s)")
+
+    seeds, cargo_args = {}, []
+    if shared_cache and groups:
+        with instrumentation.stage('dependency_cache'):
+            seeds, cargo_args = prepare_build_cache(assignment, [folders[group[0]] for group in groups.values()],
+                                                    cache_dir=cache_dir, vendor=vendor, timeout=timeout,
+                                                    cpu_seconds=cpu_seconds, memory_mb=memory_mb)
+
+    with ProcessPoolExecutor(max_workers=workers or available_cores()) as pool:
+        futures = {pool.submit(run_cargo_test, folders[group[0]], timeout, cpu_seconds, memory_mb,
+                               None, seeds.get(folders[group[0]]), cargo_args, report_time): key
+                   for key, group in groups.items()}
+        # Record the local results against the commit each folder was downloaded at
+        for future in as_completed(futures):
+            key = futures[future]
+            result = future.result()
+            first, *duplicates = groups[key]
+            if cache and result['status'] in CACHED_STATUSES:
+                cache.store(key, result)
+                # cargo adds a Cargo.lock to a submission without one; the next run sees that tree
+                key_after = result_cache.submission_key(folders[first], toolchain, settings, grader_files)
+                if key_after != key:
+                    cache.store(key_after, result)
+            results[first] = result
+            for people in duplicates:
+                results[people] = dict(result, folder=folders[people], cached=True)
+            for people in groups[key]:
+                record_result(people, assignment, results[people], commits.get(folders[people]), log_dir,
+                              db_path=db_path)
+
+    return [dict(results[people], username=people) for people in participants]
+
+# Function to print one line per student after a class run
+def print_summary(results):
+    for result in results:
+        if result['status'] in ('ok', 'failed'):
+            cached = ' (cached)' if result.get('cached') else ''
+            print(f"{result['username']}: {result['passed_tests']}/{result['total_tests']} tests passed.{cached}")
+        else:
+            print(f"{result['username']}: {result['status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run cargo test for every student's downloaded submission.")
+    parser.add_argument('assignment', help="assignment folder under repo/, e.g. homework-1")
+    parser.add_argument('--participants', default='participants.txt', help="participants file, one username per line")
+    parser.add_argument('--workers', type=int, default=None, help="parallel jobs (default: available cores)")
+    parser.add_argument('--timeout', type=int, default=CARGO_TIMEOUT, help="wall-clock seconds per student")
+    parser.add_argument('--cpu-seconds', type=int, default=CARGO_CPU_SECONDS, help="CPU seconds per process")
+    parser.add_argument('--memory-mb', type=int, default=CARGO_MEMORY_MB, help="address space per process in MB")
+    parser.add_argument('--no-shared-cache', action='store_true',
+                        help="build every submission from scratch instead of from the shared dependency cache")
+    parser.add_argument('--no-vendor', action='store_true', help="do not vendor the crate registry before building")
+    parser.add_argument('--resume', action='store_true',
+                        help="skip students whose tests already completed at their downloaded commit")
+    parser.add_argument('--report-time', action='store_true',
+                        help="record the duration of every test (libtest --report-time, run with RUSTC_BOOTSTRAP=-1)")
+    parser.add_argument('--result-cache', default=result_cache.RESULT_CACHE_DIR, metavar='DIR',
+                        help="directory of the test result cache, keyed by submission content")
+    parser.add_argument('--no-result-cache', action='store_true',
+                        help="run every submission's tests even if an identical tree was tested before")
+    parser.add_argument('--grader-files', nargs='+', default=[], metavar='PATH',
+                        help="grader test files or folders; changing them invalidates cached results")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.reporting(args):
+        results = run_class(args.assignment, participants_file=args.participants, workers=args.workers,
+                            timeout=args.timeout, cpu_seconds=args.cpu_seconds, memory_mb=args.memory_mb,
+                            shared_cache=not args.no_shared_cache, vendor=not args.no_vendor, resume=args.resume,
+                            result_cache_dir=None if args.no_result_cache else args.result_cache,
+                            grader_files=args.grader_files, report_time=args.report_time)
+        print_summary(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,47 @@
-import gitlab
+import argparse
+import base64
+import codecs
+import fnmatch
+import http_cache
+import importlib.util
+import instrumentation
+import io
+import json
+import mimetypes
+import re
+import results_store
+import shutil
+import subprocess
 import sys
 import os
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
-from collections import defaultdict
-from datetime import datetime
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+
+
+# Function to import a module on first attribute access instead of at startup
+def lazy_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+# gitlab and requests take a large part of a second to import, so they are only loaded once a
+# GitLab connection is made; --help and commands that never reach GitLab start without them
+gitlab = lazy_import('gitlab')
+requests = lazy_import('requests')
 
 # PRIVATE_TOKEN = os.environ.get('GITLAB_PRIVATE_TOKEN')
 # if not PRIVATE_TOKEN:
@@ -11,7 +49,20 @@ from datetime import datetime
 
 
 
-# Define required files
+# Last downloaded commit SHA of every project and ref, used to skip unchanged repositories
+DOWNLOAD_MANIFEST = 'repo/.download-manifest.json'
+MANIFEST_LOCK = threading.Lock()
+
+# Bare mirrors used by the 'git' repository backend, one per student project
+MIRROR_DIR = 'mirrors'
+
+# Above this many changed files a fresh archive download is cheaper than patching file by file
+MAX_INCREMENTAL_FILES = 50
+
+# Journal stages completed by check_repo.py; 'local-test' is recorded by cargo_runner.py
+CHECK_STAGES = ['metadata', 'download', 'ci']
+
+# Define required files: paths from the repository root, globs such as 'src/*.rs', or folders ending in '/'
 REQUIRED_FILES = []
 
 # Replace with your GitLab URL and ensure the private token is set as an environment variable
@@ -20,24 +71,137 @@ PRIVATE_TOKEN = 'YOUR_TOKEN_AT_HERE' # put your token here. You can get it from
 
 
 
-def list_commit_date_range(project, ref='main', start_date_str='2024-08-15'):
+# GitLab commit timestamps look like 2024-09-08T21:57:57.000-04:00
+COMMIT_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+
+# Largest page GitLab serves; full listings take a fifth of the requests of the default 20
+API_PAGE_SIZE = 100
+
+# Pipelines listed per branch, newest first; only the latest one is graded
+PIPELINE_PAGE_SIZE = 5
+
+
+def parse_commit_date(created_at):
+    return datetime.strptime(created_at, COMMIT_DATE_FORMAT)
+
+
+# The commit history of one ref, fetched once and shared by every commit analysis.
+# Dates are parsed and the per-author, per-day and date-range aggregates are
+# computed in a single pass over the history.
+class CommitSnapshot:
+    def __init__(self, commits, ref='main'):
+        self.ref = ref
+        # Newest first, as returned by GitLab
+        self.commits = list(commits)
+        self.dates = {}
+        self.commits_per_author = defaultdict(int)
+        self.commits_per_day = defaultdict(int)
+        self.first_date = None
+        self.last_date = None
+
+        for commit in self.commits:
+            created = parse_commit_date(commit.created_at)
+            self.dates[commit.id] = created
+            self.commits_per_author[commit.author_name] += 1
+            day = created.date()
+            self.commits_per_day[day] += 1
+            if self.first_date is None or day < self.first_date:
+                self.first_date = day
+            if self.last_date is None or day > self.last_date:
+                self.last_date = day
+
+    # Read the history through a repository backend when given, else the REST API
+    @classmethod
+    def fetch(cls, project, ref='main', backend=None, since=None, until=None):
+        if backend is not None:
+            return cls(backend.list_commits(ref, since=since, until=until), ref=ref)
+        return cls(list_commits(project, ref=ref, since=since, until=until), ref=ref)
+
+    def __len__(self):
+        return len(self.commits)
+
+    # SHA of the newest commit on the ref, or None for an empty history
+    @property
+    def head_sha(self):
+        return self.commits[0].id if self.commits else None
+
+    def __iter__(self):
+        return iter(self.commits)
+
+    def date_of(self, commit):
+        return self.dates[commit.id]
+
+    # Commits made strictly after the given date, newest first
+    def after(self, start_date):
+        return [commit for commit in self.commits if self.dates[commit.id].date() > start_date]
+
+    # Commits made within [start_date, end_date], newest first
+    def between(self, start_date, end_date):
+        return [commit for commit in self.commits if start_date <= self.dates[commit.id].date() <= end_date]
+
+
+# Function to match a repository path against a pattern component by component: '*' stays within
+# one directory ('src/*.rs' does not match 'src/a/b.rs') and '**' matches any number of directories
+def match_path(path, pattern):
+    return match_parts(path.split('/'), pattern.strip('/').split('/'))
+
+def match_parts(parts, pattern_parts):
+    if not pattern_parts:
+        return not parts
+    if pattern_parts[0] == '**':
+        return any(match_parts(parts[i:], pattern_parts[1:]) for i in range(len(parts) + 1))
+    return bool(parts) and fnmatch.fnmatchcase(parts[0], pattern_parts[0]) and match_parts(parts[1:], pattern_parts[1:])
+
+
+# The complete file tree of one ref, fetched with a single recursive listing and shared by the
+# printed listing, the required-file check and the download of the run
+class TreeSnapshot:
+    def __init__(self, items, ref='main'):
+        self.ref = ref
+        self.items = list(items)
+        self.blobs = [item['path'] for item in self.items if item['type'] == 'blob']
+        self.trees = [item['path'] for item in self.items if item['type'] == 'tree']
+
+    # Read the tree through a repository backend when given, else the REST API
+    @classmethod
+    def fetch(cls, project, ref='main', backend=None):
+        if backend is not None:
+            return cls(backend.list_tree(ref=ref, recursive=True), ref=ref)
+        return cls(project.repository_tree(ref=ref, recursive=True, per_page=API_PAGE_SIZE, get_all=True), ref=ref)
+
+    # Entries directly inside a folder ('' is the repository root)
+    def children(self, path=''):
+        path = path.strip('/')
+        return [item for item in self.items if item['path'].rpartition('/')[0] == path]
+
+    # Whether a required entry is present: a file path or glob such as 'src/*.rs', or a folder ending in '/'
+    def has(self, pattern):
+        candidates = self.trees if pattern.endswith('/') else self.blobs
+        return any(match_path(path, pattern) for path in candidates)
+
+
+def list_commit_date_range(project, ref='main', start_date_str='2024-08-15', snapshot=None):
     try:
         # Parse the provided start date
         start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
         
-        # Retrieve the list of commits for the specified branch
-        commits = project.commits.list(ref_name=ref, all=True)
-        
-        # Filter commits after the provided start date
-        filtered_commits = [commit for commit in commits if datetime.strptime(commit.created_at, "%Y-%m-%dT%H:%M:%S.%f%z").date() > start_date.date()]
+        if snapshot is not None:
+            # Reuse the commit history fetched for this run
+            filtered_commits = snapshot.after(start_date.date())
+        else:
+            # Let GitLab drop older commits; since is an instant, so allow a day for time zones and
+            # compare the committer's local date (the first 10 characters of created_at) here
+            since = (start_date - timedelta(days=1)).strftime("%Y-%m-%dT00:00:00Z")
+            filtered_commits = [commit for commit in list_commits(project, ref=ref, since=since, iterator=True)
+                                if commit.created_at[:10] > start_date_str]
         
         if not filtered_commits:
             print(f"No commits found after {start_date_str}.")
             return
         
-        # Get the date range of the filtered commits
-        first_commit_date = datetime.strptime(filtered_commits[-1].created_at, "%Y-%m-%dT%H:%M:%S.%f%z").date()
-        last_commit_date = datetime.strptime(filtered_commits[0].created_at, "%Y-%m-%dT%H:%M:%S.%f%z").date()
+        # Get the date range of the filtered commits (newest first)
+        first_commit_date = filtered_commits[-1].created_at[:10]
+        last_commit_date = filtered_commits[0].created_at[:10]
         
         print(f"Commit date range after {start_date_str}: {first_commit_date} to {last_commit_date}")
         return filtered_commits
@@ -51,14 +215,15 @@ def list_commit_date_range(project, ref='main', start_date_str='2024-08-15'):
 
 def filter_commits_by_date_range(commits, start_date_str, end_date_str):
     try:
-        # Parse the provided start and end dates
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-        end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
+        # Validate the provided start and end dates
+        datetime.strptime(start_date_str, "%Y-%m-%d")
+        datetime.strptime(end_date_str, "%Y-%m-%d")
         
-        # Filter commits within the provided date range
+        # Filter commits within the provided date range. ISO dates compare as strings, so the
+        # committer's local date is read from created_at without parsing every timestamp
         filtered_commits = [
             commit for commit in commits
-            if start_date.date() <= datetime.strptime(commit.created_at, "%Y-%m-%dT%H:%M:%S.%f%z").date() <= end_date.date()
+            if start_date_str <= commit.created_at[:10] <= end_date_str
         ]
         
         if not filtered_commits:
@@ -72,17 +237,106 @@ def filter_commits_by_date_range(commits, start_date_str, end_date_str):
         return []
     
 
+# Function to list the commits of a ref, newest first. since/until (ISO 8601) are applied by GitLab,
+# so a date window only costs the pages inside it; iterator=True fetches those pages lazily
+def list_commits(project, ref='main', since=None, until=None, iterator=False):
+    filters = {name: value for name, value in (('since', since), ('until', until)) if value}
+    if iterator:
+        return project.commits.list(ref_name=ref, per_page=API_PAGE_SIZE, iterator=True, **filters)
+    return project.commits.list(ref_name=ref, per_page=API_PAGE_SIZE, get_all=True, **filters)
+
+# Function to find the newest commit of a ref made before a deadline (ISO 8601), e.g. to grade the
+# state of a submission at the due date. Only a one-commit page is requested, however long the history
+def last_commit_before(project, ref='main', deadline=None):
+    commits = project.commits.list(ref_name=ref, until=deadline, per_page=1, get_all=False)
+    return commits[0] if commits else None
+
 
 if not PRIVATE_TOKEN:
     print("Error: GITLAB_PRIVATE_TOKEN environment variable not set.")
     sys.exit(1)
 
-# Function to initialize GitLab connection
-def init_gitlab(url, token):
+# Global back-off shared by every worker thread. When GitLab answers 429 or its
+# RateLimit-* headers say the budget is nearly spent, all requests pause until it resets.
+class RateLimiter:
+    def __init__(self, min_remaining=5, default_backoff=10):
+        self.min_remaining = min_remaining
+        self.default_backoff = default_backoff
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    # Block the calling thread while a back-off is in effect
+    def wait(self):
+        while True:
+            with self.lock:
+                delay = self.resume_at - time.time()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    # Inspect a response and start a back-off if GitLab asks for one
+    def observe(self, response):
+        headers = response.headers
+        remaining = headers.get('RateLimit-Remaining', '')
+        if response.status_code == 429:
+            delay = self.backoff_delay(headers)
+        elif remaining.isdigit() and int(remaining) <= self.min_remaining:
+            delay = self.backoff_delay(headers)
+        else:
+            return
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.time() + delay)
+        print(f"GitLab rate limit reached, pausing all requests for {delay:.0f}s")
+
+    def backoff_delay(self, headers):
+        retry_after = headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return int(retry_after)
+        reset = headers.get('RateLimit-Reset', '')
+        if reset.isdigit():
+            return max(int(reset) - time.time(), 1)
+        return self.default_backoff
+
+# Transport adapter that consults the shared RateLimiter around every request sent by the
+# wrapped (pooled) adapter
+class RateLimitedAdapter:
+    def __init__(self, adapter, rate_limiter):
+        self.adapter = adapter
+        self.rate_limiter = rate_limiter
+
+    def send(self, request, **kwargs):
+        self.rate_limiter.wait()
+        response = self.adapter.send(request, **kwargs)
+        self.rate_limiter.observe(response)
+        instrumentation.STATS.count_response(response)
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+# Function to build one pooled HTTP session shared by every GitLab request of a run
+# Responses are kept in an on-disk cache under http_cache_dir and revalidated with ETags; None disables it
+def make_session(pool_size=10, rate_limiter=None, http_cache_dir=http_cache.HTTP_CACHE_DIR):
+    if rate_limiter is None:
+        rate_limiter = RateLimiter()
+    session = requests.Session()
+    adapter = RateLimitedAdapter(requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size),
+                                 rate_limiter)
+    if http_cache_dir:
+        adapter = http_cache.CachingAdapter(adapter, http_cache.HttpCache(http_cache_dir))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Function to initialize GitLab connection. With auth=False the token is trusted without the
+# /user round trip; an invalid token then surfaces as an error on the first API call
+@instrumentation.stage('init')
+def init_gitlab(url, token, session=None, auth=True):
     try:
-        gl = gitlab.Gitlab(url, private_token=token)
-        gl.auth()  # Authenticate
-        print("Successfully authenticated with GitLab.")
+        gl = gitlab.Gitlab(url, private_token=token, session=session)
+        if auth:
+            gl.auth()  # Authenticate
+            print("Successfully authenticated with GitLab.")
         return gl
     except gitlab.exceptions.GitlabAuthenticationError:
         print("Authentication failed. Please check your access token.")
@@ -92,6 +346,7 @@ def init_gitlab(url, token):
         sys.exit(1)
 
 # Function to get a project by its URL
+@instrumentation.stage('project')
 def get_project(gl, project_url):
     try:
         parsed_url = urlparse(project_url)
@@ -106,7 +361,31 @@ def get_project(gl, project_url):
         print(f"An error occurred while retrieving the project: {e}")
         sys.exit(1)
 
-import base64
+# Function to fetch the file tree of a branch once for all tree-based checks
+@instrumentation.stage('tree')
+def get_tree_snapshot(project, ref='main', backend=None):
+    try:
+        return TreeSnapshot.fetch(project, ref=ref, backend=backend)
+    except gitlab.exceptions.GitlabGetError as e:
+        print(f"Failed to retrieve the repository tree: {e}")
+    except subprocess.CalledProcessError as e:
+        print(f"Failed to read the tree from the local mirror: {e.stderr.decode(errors='replace').strip()}")
+    except Exception as e:
+        print(f"An error occurred while fetching the repository tree: {e}")
+    return None
+
+# Function to fetch the commit history of a branch once for all commit analyses; None if it could not be read
+@instrumentation.stage('commits')
+def get_commit_snapshot(project, ref='main', backend=None):
+    try:
+        return CommitSnapshot.fetch(project, ref=ref, backend=backend)
+    except gitlab.exceptions.GitlabGetError as e:
+        print(f"Failed to retrieve commits: {e}")
+    except subprocess.CalledProcessError as e:
+        print(f"Failed to read commits from the local mirror: {e.stderr.decode(errors='replace').strip()}")
+    except Exception as e:
+        print(f"An error occurred while fetching commits: {e}")
+    return None
 
 # Function to count the number of tests in 'tests/lex.rs'
 def count_tests_in_lex_rs(project, ref='main', file_path='tests/lex.rs'):
@@ -131,70 +410,162 @@ def count_tests_in_lex_rs(project, ref='main', file_path='tests/lex.rs'):
 
 # print CI/CD pipeline log
 
-import re
+# One pre-compiled pattern for every line of a cargo test trace
+TEST_LINE_PATTERN = re.compile(
+    r"running (?P<running>\d+) tests?\b"
+    r"|test result: (?:ok|FAILED)\. (?P<passed>\d+) passed; (?P<failed>\d+) failed"
+    r"|test (?P<name>.+?) \.\.\. (?P<outcome>ok|FAILED|ignored)(?: <(?P<seconds>\d+(?:\.\d+)?)s>)?"
+    r"|Doc-tests (?P<doctests>\S+)"
+)
+
+# The CI job whose log contains the cargo test output
+TEST_JOB_STAGE = 'test'
+TEST_JOB_NAME_HINT = 'test'
+FINISHED_JOB_STATUSES = ('success', 'failed')
+
+# Returned by print_pipeline_log when the test job has not finished (running, pending, canceled,
+# manual), so it has no test results yet; distinct from 0 tests and from None (request failed)
+CI_NOT_READY = 'not-ready'
+
+# Size of the pieces a job trace is downloaded in
+TRACE_CHUNK_SIZE = 64 * 1024
+
+# Single-pass parser for cargo test output that is fed a trace chunk by chunk. It keeps only
+# the per-test outcomes and running totals, never the whole log. Doc-tests are the last test
+# binary cargo runs, so their "test result:" line is the final summary and parsing stops there
+class TestLogParser:
+    def __init__(self):
+        self.tests = []
+        self.running = 0
+        self.summary_passed = 0
+        self.summary_failed = 0
+        self.summaries = 0
+        self.in_doctests = False
+        self.finished = False
+        self.bytes_read = 0
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.partial_line = ''
+
+    # Feed the next chunk (bytes or str); returns True once the final summary has been seen
+    def feed(self, chunk):
+        if self.finished:
+            return True
+        if isinstance(chunk, bytes):
+            self.bytes_read += len(chunk)
+            chunk = self.decoder.decode(chunk)
+        lines = (self.partial_line + chunk).split('\n')
+        self.partial_line = lines.pop()
+        for line in lines:
+            self.feed_line(line)
+            if self.finished:
+                break
+        return self.finished
+
+    def close(self):
+        if not self.finished:
+            self.feed_line(self.partial_line + self.decoder.decode(b'', final=True))
+        self.partial_line = ''
+
+    def feed_line(self, line):
+        match = TEST_LINE_PATTERN.search(line)
+        if match is None:
+            return
+        if match.group('running') is not None:
+            self.running += int(match.group('running'))
+        elif match.group('passed') is not None:
+            self.summary_passed += int(match.group('passed'))
+            self.summary_failed += int(match.group('failed'))
+            self.summaries += 1
+            self.finished = self.in_doctests
+        elif match.group('name') is not None:
+            seconds = match.group('seconds')
+            self.tests.append((match.group('name'), match.group('outcome'), float(seconds) if seconds else None))
+        else:
+            self.in_doctests = True
 
-def analyze_test_results(log):
-    # Regular expressions to capture test results
-    total_tests_pattern = re.compile(r"running (\d+) tests")
-    passed_tests_pattern = re.compile(r"test result: ok\. (\d+) passed; (\d+) failed")
-    individual_pass_pattern = re.compile(r"test .+ \.\.\. ok")
-    individual_fail_pattern = re.compile(r"test .+ \.\.\. FAILED")
-
-    # Counters for total, passed, and failed tests
-    total_tests = 0
-    passed_tests = 0
-    failed_tests = 0
-
-    # Analyze each line in the log
-    for line in log.splitlines():
-        if total_tests_match := total_tests_pattern.search(line):
-            total_tests = int(total_tests_match.group(1))
-        elif passed_tests_match := passed_tests_pattern.search(line):
-            passed_tests += int(passed_tests_match.group(1))
-            failed_tests += int(passed_tests_match.group(2))
-        elif individual_pass_pattern.search(line):
-            passed_tests += 1
-        elif individual_fail_pattern.search(line):
-            failed_tests += 1
-
-    # If we haven't found the total tests from the first pattern, calculate it from passed + failed
-    if total_tests == 0:
-        total_tests = passed_tests + failed_tests
-
-    return total_tests, passed_tests, failed_tests
+    # (total, passed, failed); the "test result:" summaries win over counting individual lines
+    def totals(self):
+        if self.summaries:
+            passed_tests, failed_tests = self.summary_passed, self.summary_failed
+        else:
+            passed_tests = sum(1 for _, outcome, _ in self.tests if outcome == 'ok')
+            failed_tests = sum(1 for _, outcome, _ in self.tests if outcome == 'FAILED')
+        total_tests = passed_tests + failed_tests or self.running
+        return total_tests, passed_tests, failed_tests
 
+def analyze_test_results(log):
+    parser = TestLogParser()
+    parser.feed(log)
+    parser.close()
+    return parser.totals()
+
+# Function to parse a job trace while it downloads, without holding the whole log in memory.
+# The download stops as soon as the final test summary has been read
+def parse_job_trace(job, chunk_size=TRACE_CHUNK_SIZE):
+    parser = TestLogParser()
+    # Fetches the raw response (as ProjectJob.trace does) so the connection can be closed early
+    try:
+        response = job.manager.gitlab.http_get(f'{job.manager.path}/{job.encoded_id}/trace', streamed=True, raw=True)
+    except gitlab.exceptions.GitlabHttpError as e:
+        raise gitlab.exceptions.GitlabGetError(e.error_message, e.response_code, e.response_body) from e
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk and parser.feed(chunk):
+                break
+    finally:
+        # Drops the connection instead of reading the rest of the log
+        response.close()
+    parser.close()
+    return parser
+
+# Function to pick the job whose trace holds the test results, using only the jobs list response.
+# Jobs in the test stage (or named like one) win; among those the most recent run is used
+def select_test_job(jobs, stage=TEST_JOB_STAGE, name_hint=TEST_JOB_NAME_HINT):
+    candidates = [job for job in jobs if job.stage == stage or name_hint in job.name.lower()]
+    if not candidates:
+        candidates = list(jobs)
+    if not candidates:
+        return None
+    return max(candidates, key=lambda job: job.id)
+
+# Function to print the jobs of a pipeline and analyze the test job's log. Returns (total, passed, failed, tests),
+# zeros when no test results exist yet, or None when GitLab could not be read
+@instrumentation.stage('ci_trace')
 def print_pipeline_log(project, pipeline_id):
     try:
-        pipeline = project.pipelines.get(pipeline_id)
-        jobs = pipeline.jobs.list()
-        
+        # A lazy pipeline object costs no request; only its jobs list is fetched
+        pipeline = project.pipelines.get(pipeline_id, lazy=True)
+        jobs = pipeline.jobs.list(per_page=API_PAGE_SIZE, get_all=True)
         for job in jobs:
-            # Retrieve the full job object using its ID to access complete data
-            job_full = project.jobs.get(job.id)
-            print(f"Job ID: {job_full.id}, Name: {job_full.name}, Status: {job_full.status}")
-            
-            # Process only if the job has failed or as required
-            log = job_full.trace()
-            if log:
-                # Decode the log from bytes to a string
-                log = log.decode('utf-8')
-                
-                # Analyze the test results from the log
-                total_tests, passed_tests, failed_tests = analyze_test_results(log)
-                
-                print(f"Test Analysis for Job ID {job_full.id}:")
-                print(f"  Total tests run: {total_tests}")
-                print(f"  Tests passed: {passed_tests}")
-                print(f"  Tests failed: {failed_tests}")
-                return total_tests, passed_tests, failed_tests
-                
+            print(f"Job ID: {job.id}, Name: {job.name}, Stage: {job.stage}, Status: {job.status}")
+
+        job = select_test_job(jobs)
+        if job is None:
+            print(f"No jobs found in pipeline {pipeline_id}.")
+            return 0, 0, 0, []
+        if job.status not in FINISHED_JOB_STATUSES:
+            print(f"Job {job.name} is {job.status}, no test results yet.")
+            return CI_NOT_READY
+
+        # Stream only the selected job's log and analyze the test results as it arrives
+        parser = parse_job_trace(project.jobs.get(job.id, lazy=True))
+        total_tests, passed_tests, failed_tests = parser.totals()
+
+        print(f"Test Analysis for Job ID {job.id}:")
+        print(f"  Total tests run: {total_tests}")
+        print(f"  Tests passed: {passed_tests}")
+        print(f"  Tests failed: {failed_tests}")
+        return total_tests, passed_tests, failed_tests, parser.tests
+
     except gitlab.exceptions.GitlabGetError as e:
         print(f"Failed to retrieve pipeline or job: {e}")
     except Exception as e:
         print(f"An error occurred while printing pipeline log: {e}")
+    return None
 
 
 # Function to list available branches
+@instrumentation.stage('project')
 def list_branches(project):
     try:
         branches = project.branches.list()
@@ -205,6 +576,7 @@ def list_branches(project):
         print(f"Failed to list branches: {e}")
 
 # Function to get the default branch
+@instrumentation.stage('project')
 def get_default_branch(project):
     try:
         return project.default_branch
@@ -213,9 +585,14 @@ def get_default_branch(project):
         return 'master'  # Fallback to 'master' if detection fails
 
 # Function to list repository contents
-def list_repo_contents(project, ref='main', path=''):
+def list_repo_contents(project, ref='main', path='', backend=None, tree=None):
     try:
-        items = project.repository_tree(ref=ref, path=path, all=True)
+        if tree is not None:
+            items = tree.children(path)
+        elif backend is not None:
+            items = backend.list_tree(ref=ref, path=path)
+        else:
+            items = project.repository_tree(ref=ref, path=path, per_page=API_PAGE_SIZE, get_all=True)
         if not items:
             print("  No items found in the repository.")
             return
@@ -234,10 +611,11 @@ def list_repo_contents(project, ref='main', path=''):
         print(f"  An error occurred while listing repository contents: {e}")
 
 # Function to get commit count
-def get_commit_count(project, ref='main'):
+def get_commit_count(project, ref='main', snapshot=None):
     try:
-        commits = project.commits.list(ref_name=ref, all=True)
-        commit_count = len(commits)
+        if snapshot is None:
+            snapshot = CommitSnapshot.fetch(project, ref=ref)
+        commit_count = len(snapshot)
         print(f"Total number of commits on branch '{ref}': {commit_count}")
         return commit_count
     except gitlab.exceptions.GitlabGetError as e:
@@ -248,9 +626,11 @@ def get_commit_count(project, ref='main'):
         return 0
 
 # Function to list commit details
-def list_commit_details(project, ref='main'):
+def list_commit_details(project, ref='main', snapshot=None):
     try:
-        commits = project.commits.list(ref_name=ref, all=True)
+        if snapshot is None:
+            snapshot = CommitSnapshot.fetch(project, ref=ref)
+        commits = snapshot.commits
         print(f"\nCommit Details for branch '{ref}':")
         for commit in commits:
             print(f"Commit ID: {commit.id}")
@@ -264,13 +644,11 @@ def list_commit_details(project, ref='main'):
         print(f"An error occurred while listing commit details: {e}")
 
 # Function to get commits per author
-def get_commits_per_author(project, ref='main'):
+def get_commits_per_author(project, ref='main', snapshot=None):
     try:
-        commits = project.commits.list(ref_name=ref, all=True)
-        author_commit_count = defaultdict(int)
-        for commit in commits:
-            author = commit.author_name
-            author_commit_count[author] += 1
+        if snapshot is None:
+            snapshot = CommitSnapshot.fetch(project, ref=ref)
+        author_commit_count = snapshot.commits_per_author
 
         print(f"\nCommits per author on branch '{ref}':")
         for author, count in author_commit_count.items():
@@ -284,16 +662,11 @@ def get_commits_per_author(project, ref='main'):
         return {}
 
 # Function to get commit frequency
-def get_commit_frequency(project, ref='main'):
+def get_commit_frequency(project, ref='main', snapshot=None):
     try:
-        commits = project.commits.list(ref_name=ref, all=True)
-        commit_dates = defaultdict(int)
-        for commit in commits:
-            # Parse the commit date
-            # date = datetime.strptime(commit.created_at, r"%Y-%m-%dT%H:%M:%SZ").date()
-            # format is like 2024-09-08T21:57:57.000-04:00
-            date = datetime.strptime(commit.created_at, r"%Y-%m-%dT%H:%M:%S.%f%z").date()
-            commit_dates[date] += 1
+        if snapshot is None:
+            snapshot = CommitSnapshot.fetch(project, ref=ref)
+        commit_dates = snapshot.commits_per_day
 
         print(f"\nCommit frequency on branch '{ref}':")
         for date, count in sorted(commit_dates.items()):
@@ -306,12 +679,13 @@ def get_commit_frequency(project, ref='main'):
         print(f"An error occurred while calculating commit frequency: {e}")
         return {}
 
-# Function to check required files
-def check_required_files(project, ref='main', required_files=REQUIRED_FILES):
+# Function to check required files. Entries are paths relative to the repository root and may be
+# nested or glob patterns, e.g. 'Cargo.toml', 'tests/lex.rs', 'src/*.rs' or 'src/'
+def check_required_files(project, ref='main', required_files=REQUIRED_FILES, backend=None, tree=None):
     try:
-        files = project.repository_tree(ref=ref, all=True)
-        file_names = [file['name'] for file in files if file['type'] == 'blob']
-        missing_files = [file for file in required_files if file not in file_names]
+        if tree is None:
+            tree = TreeSnapshot.fetch(project, ref=ref, backend=backend)
+        missing_files = [file for file in required_files if not tree.has(file)]
 
         if not missing_files:
             print("\nAll required files are present.")
@@ -328,9 +702,10 @@ def check_required_files(project, ref='main', required_files=REQUIRED_FILES):
         return required_files
 
 # Function to list merge requests
+@instrumentation.stage('merge_requests')
 def list_merge_requests(project):
     try:
-        merge_requests = project.mergerequests.list(state='all', all=True)
+        merge_requests = project.mergerequests.list(state='all', per_page=API_PAGE_SIZE, get_all=True)
         if not merge_requests:
             print("\nNo merge requests found.")
             return []
@@ -345,10 +720,13 @@ def list_merge_requests(project):
         print(f"An error occurred while listing merge requests: {e}")
         return []
 
-# Function to check CI/CD status
+# Function to check CI/CD status; returns the newest pipelines, [] if there are none, or None on error
+@instrumentation.stage('ci_status')
 def check_ci_status(project, ref='main'):
     try:
-        pipelines = project.pipelines.list(ref=ref, all=True)
+        # Only the newest pipeline is graded, so one small page is enough
+        pipelines = project.pipelines.list(ref=ref, order_by='id', sort='desc', per_page=PIPELINE_PAGE_SIZE,
+                                           get_all=False)
         if not pipelines:
             print(f"\nNo CI/CD pipelines found for branch '{ref}'.")
             return []
@@ -366,14 +744,10 @@ def check_ci_status(project, ref='main'):
         return pipelines
     except gitlab.exceptions.GitlabGetError as e:
         print(f"Failed to retrieve pipelines: {e}")
-        return []
+        return None
     except Exception as e:
         print(f"An error occurred while checking CI/CD status: {e}")
-        return []
-
-import base64
-import os
-from urllib.parse import urlparse
+        return None
 
 # Function to parse the repository URL and extract username and homework number
 def parse_repo_url(repo_url):
@@ -390,21 +764,51 @@ def parse_repo_url(repo_url):
     # local_folder_name = f"repo/quiz-{homework_number}/{username}-cse262/quiz-{homework_number}"
     local_folder_name = f"repo/{type_string}-{homework_number}/{username}-cse262/{type_string}-{homework_number}"
     return local_folder_name
-import base64
-import os
 
-import os
-import base64
-import mimetypes
-
-def download_project(project, ref='main', folder_path='', local_dir='./'):
+# Function to write one repository file fetched with the files API to local_file_path
+def download_file(project, file_path, ref, local_file_path):
+    file = project.files.get(file_path=file_path, ref=ref)
+    
+    # Decode the file content from base64
+    file_content = base64.b64decode(file.content)
+    
+    # Determine the file type (text or binary)
+    mime_type, _ = mimetypes.guess_type(file_path)
+    is_text = mime_type and mime_type.startswith('text')
+    
+    # Write as text if it's a text file, else write as binary
+    if is_text:
+        with open(local_file_path, 'w', encoding='utf-8') as f:
+            f.write(file_content.decode('utf-8'))
+    else:
+        with open(local_file_path, 'wb') as f:
+            f.write(file_content)
+
+# Function to download the files of a folder planned from a tree snapshot, with no tree request per directory
+def download_tree(project, tree, ref='main', folder_path='', local_dir='./'):
+    prefix = f"{folder_path.strip('/')}/" if folder_path.strip('/') else ''
+    file_paths = [path for path in tree.blobs if path.startswith(prefix) and not is_ignored_path(path)]
+    if not file_paths:
+        print("Failure")
+        return
+    for file_path in file_paths:
+        local_file_path = os.path.join(local_dir, *file_path[len(prefix):].split('/'))
+        os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
+        download_file(project, file_path, ref, local_file_path)
+
+def download_project(project, ref='main', folder_path='', local_dir='./', tree=None):
     try:
         # Create the local directory if it doesn't exist
         if not os.path.exists(local_dir):
             os.makedirs(local_dir)
         
+        # With a tree snapshot the whole download is planned up front
+        if tree is not None:
+            download_tree(project, tree, ref=ref, folder_path=folder_path, local_dir=local_dir)
+            return
+        
         # Retrieve the folder contents from the repository
-        items = project.repository_tree(ref=ref, path=folder_path, all=True)
+        items = project.repository_tree(ref=ref, path=folder_path, per_page=API_PAGE_SIZE, get_all=True)
         
         if not items:
             print("Failure")
@@ -414,25 +818,9 @@ def download_project(project, ref='main', folder_path='', local_dir='./'):
         for item in items:
             if item['type'] == 'blob':  # It's a file
                 file_path = f"{folder_path}/{item['name']}".lstrip('/') if folder_path else item['name']
-                file = project.files.get(file_path=file_path, ref=ref)
-                
-                # Decode the file content from base64
-                file_content = base64.b64decode(file.content)
-                
-                # Determine the file type (text or binary)
-                mime_type, _ = mimetypes.guess_type(item['name'])
-                is_text = mime_type and mime_type.startswith('text')
                 
                 # Write the file content to the local file
-                local_file_path = os.path.join(local_dir, item['name'])
-                
-                # Write as text if it's a text file, else write as binary
-                if is_text:
-                    with open(local_file_path, 'w', encoding='utf-8') as f:
-                        f.write(file_content.decode('utf-8'))
-                else:
-                    with open(local_file_path, 'wb') as f:
-                        f.write(file_content)
+                download_file(project, file_path, ref, os.path.join(local_dir, item['name']))
             
             elif item['type'] == 'tree':  # It's a directory
                 subfolder_path = os.path.join(local_dir, item['name'])
@@ -441,20 +829,375 @@ def download_project(project, ref='main', folder_path='', local_dir='./'):
     except Exception as e:
         print(f"An error occurred: {e}")
 
-        
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python check_repo.py <student_repo_url>")
-        sys.exit(1)
 
-    student_repo_url = sys.argv[1]
+# Build output and editor noise that students sometimes commit despite .gitignore;
+# these are never written to disk when downloading from an archive
+IGNORED_DIRS = {'target', '.git', '.idea', '.vscode', '__pycache__'}
+IGNORED_FILES = ['.DS_Store', '*.rlib', '*.so', '*.o', '*.pdb', '*.swp']
+
+# Function to decide whether an archive path should be skipped
+def is_ignored_path(path):
+    parts = path.split('/')
+    if any(part in IGNORED_DIRS for part in parts):
+        return True
+    return any(fnmatch.fnmatch(parts[-1], pattern) for pattern in IGNORED_FILES)
+
+# Function to extract a streamed .tar.gz archive into local_dir, dropping the
+# '<project>-<ref>-<sha>/' folder GitLab puts around every archive
+def extract_archive(archive, local_dir):
+    root = os.path.realpath(local_dir)
+    file_count = 0
+    with tarfile.open(fileobj=archive, mode='r|gz') as tar:
+        for member in tar:
+            relative_path = member.name.split('/', 1)[1] if '/' in member.name else ''
+            if not relative_path or is_ignored_path(relative_path):
+                continue
+            target = os.path.realpath(os.path.join(root, relative_path))
+            if not target.startswith(root + os.sep):
+                print(f"Skipping unsafe archive path: {member.name}")
+                continue
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+            elif member.isfile():
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    shutil.copyfileobj(tar.extractfile(member), f)
+                file_count += 1
+    return file_count
+
+# Function to download a whole ref with one archive request instead of one request per file
+def download_project_archive(project, ref='main', local_dir='./'):
+    try:
+        os.makedirs(local_dir, exist_ok=True)
+
+        # Stream the archive to a temporary file, then extract it member by member
+        with tempfile.TemporaryFile() as archive:
+            project.repository_archive(sha=ref, format='tar.gz', streamed=True, action=archive.write, chunk_size=64 * 1024)
+            archive.seek(0)
+            file_count = extract_archive(archive, local_dir)
+        print(f"Downloaded {file_count} file(s) into '{local_dir}'")
+        return file_count
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return None
+
+# Function to download a submission with the selected mode: 'archive' (one request) or 'files' (one request per file).
+# Returns False if the download failed
+def download_submission(project, ref='main', local_dir='./', download_mode='archive', tree=None):
+    if download_mode == 'files':
+        download_project(project, ref=ref, folder_path='', local_dir=local_dir, tree=tree)
+        return True
+    return download_project_archive(project, ref=ref, local_dir=local_dir) is not None
+
+# Function to read the download manifest: '<project path>@<ref>' -> last downloaded commit SHA
+def load_manifest(manifest_path=DOWNLOAD_MANIFEST):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
 
-    # Initialize GitLab connection
-    gl = init_gitlab(GITLAB_URL, PRIVATE_TOKEN)
+# Function to record the commit SHA a local folder was last downloaded at
+def update_manifest(key, entry, manifest_path=DOWNLOAD_MANIFEST):
+    with MANIFEST_LOCK:
+        manifest = load_manifest(manifest_path)
+        manifest[key] = entry
+        os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+        temp_path = f'{manifest_path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, manifest_path)
+
+# Function to bring a previously downloaded folder from old_sha to new_sha by rewriting only
+# the files the compare API reports as changed. Returns False if a full download is needed,
+# e.g. after a force-push (reset, amend or rebase) left old_sha off the new history
+def apply_changes(project, old_sha, new_sha, local_dir):
+    try:
+        if project.repository_merge_base([old_sha, new_sha]).get('id') != old_sha:
+            print(f"{old_sha[:8]} is not an ancestor of {new_sha[:8]}, downloading the full tree")
+            return False
+        # straight=True diffs old_sha against new_sha directly instead of from their merge base
+        comparison = project.repository_compare(old_sha, new_sha, straight=True)
+    except gitlab.exceptions.GitlabError as e:
+        print(f"Failed to compare {old_sha[:8]}..{new_sha[:8]}: {e}")
+        return False
+
+    diffs = comparison.get('diffs', [])
+    if comparison.get('compare_timeout') or len(diffs) > MAX_INCREMENTAL_FILES:
+        return False
+
+    root = os.path.realpath(local_dir)
+    for diff in diffs:
+        # A rename or deletion removes the old path; anything not deleted is (re)written at its new path
+        if diff.get('deleted_file') or diff.get('renamed_file'):
+            old_path = os.path.join(root, diff['old_path'])
+            if os.path.isfile(old_path):
+                os.remove(old_path)
+        if diff.get('deleted_file') or is_ignored_path(diff['new_path']):
+            continue
+        target = os.path.realpath(os.path.join(root, diff['new_path']))
+        if not target.startswith(root + os.sep):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(project.files.raw(file_path=diff['new_path'], ref=new_sha))
+
+    print(f"Updated {len(diffs)} changed file(s) in '{local_dir}' ({old_sha[:8]}..{new_sha[:8]})")
+    return True
+
+# Commit record read from a local mirror, shaped like the GitLab commit objects the analyses use
+GitCommit = namedtuple('GitCommit', ['id', 'author_name', 'author_email', 'created_at', 'message'])
+
+# Repository backend that reads everything through the GitLab REST API
+class RestBackend:
+    def __init__(self, project):
+        self.project = project
+        self.name = project.path_with_namespace
+
+    def fetch(self):
+        pass
+
+    def resolve_ref(self, ref='main'):
+        return self.project.commits.get(ref).id
+
+    def list_commits(self, ref='main', since=None, until=None):
+        return list_commits(self.project, ref=ref, since=since, until=until)
+
+    def list_tree(self, ref='main', path='', recursive=False):
+        return self.project.repository_tree(ref=ref, path=path, recursive=recursive, per_page=API_PAGE_SIZE,
+                                            get_all=True)
+
+    def export(self, ref, local_dir, download_mode='archive', tree=None):
+        return download_submission(self.project, ref=ref, local_dir=local_dir, download_mode=download_mode, tree=tree)
+
+    def apply_changes(self, old_sha, new_sha, local_dir):
+        return apply_changes(self.project, old_sha, new_sha, local_dir)
+
+# Repository backend that keeps a bare mirror per student and reads commits, trees and
+# files from the local object store. Only 'git fetch' goes over the network
+class GitMirrorBackend:
+    def __init__(self, clone_url, mirror_dir, token=None, name=None):
+        self.clone_url = clone_url
+        self.mirror_dir = mirror_dir
+        self.token = token
+        self.name = name or clone_url
+
+    @classmethod
+    def for_project(cls, project, mirror_root=None, token=None):
+        mirror_dir = os.path.join(mirror_root or MIRROR_DIR, f'{project.path_with_namespace}.git')
+        token = PRIVATE_TOKEN if token is None else token
+        return cls(project.http_url_to_repo, mirror_dir, token=token, name=project.path_with_namespace)
+
+    # Authenticate over HTTP without storing the token in the mirror's config
+    def auth_args(self):
+        if not self.token:
+            return []
+        credentials = base64.b64encode(f'oauth2:{self.token}'.encode()).decode()
+        return ['-c', f'http.extraHeader=Authorization: Basic {credentials}']
+
+    def git(self, *args, **kwargs):
+        return subprocess.run(['git', '--git-dir', self.mirror_dir, *args], check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs).stdout
+
+    # Clone the mirror on first use, afterwards only fetch new objects
+    @instrumentation.stage('git_fetch')
+    def fetch(self):
+        if os.path.isdir(self.mirror_dir):
+            command = ['git', *self.auth_args(), '--git-dir', self.mirror_dir, 'fetch', '--prune', '--quiet', 'origin']
+        else:
+            os.makedirs(os.path.dirname(self.mirror_dir) or '.', exist_ok=True)
+            command = ['git', *self.auth_args(), 'clone', '--mirror', '--quiet', self.clone_url, self.mirror_dir]
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"Failed to update the mirror of {self.name}: {result.stderr.decode(errors='replace').strip()}")
+
+    def resolve_ref(self, ref='main'):
+        return self.git('rev-parse', '--verify', f'{ref}^{{commit}}').decode().strip()
+
+    # Commits newest first, with created_at in GitLab's format (2024-09-08T21:57:57.000-04:00)
+    def list_commits(self, ref='main', since=None, until=None):
+        window = []
+        if since:
+            window.append(f'--since={since}')
+        if until:
+            window.append(f'--until={until}')
+        output = self.git('log', '--format=%H%x1f%an%x1f%ae%x1f%cI%x1f%B%x1e', *window, ref,
+                          '--').decode('utf-8', 'replace')
+        commits = []
+        for record in output.split('\x1e'):
+            record = record.lstrip('\n')
+            if not record:
+                continue
+            sha, author_name, author_email, committed, message = record.split('\x1f', 4)
+            created_at = f'{committed[:19]}.000{committed[19:]}'
+            commits.append(GitCommit(sha, author_name, author_email, created_at, message))
+        return commits
+
+    # Tree entries shaped like GitLab's repository_tree items
+    def list_tree(self, ref='main', path='', recursive=False):
+        args = ['ls-tree', '-z']
+        if recursive:
+            args += ['-r', '-t']
+        args.append(ref)
+        if path:
+            args.append(path.rstrip('/') + '/')
+        items = []
+        for entry in self.git(*args).decode('utf-8', 'replace').split('\0'):
+            if not entry:
+                continue
+            info, item_path = entry.split('\t', 1)
+            mode, item_type, sha = info.split()
+            items.append({'id': sha, 'name': item_path.rsplit('/', 1)[-1], 'type': item_type,
+                          'path': item_path, 'mode': mode})
+        return items
+
+    # Stream 'git archive' straight into the same extraction used for GitLab archives
+    def export(self, ref, local_dir, download_mode='archive', tree=None):
+        try:
+            os.makedirs(local_dir, exist_ok=True)
+            process = subprocess.Popen(['git', '--git-dir', self.mirror_dir, 'archive', '--format=tar.gz',
+                                        '--prefix=export/', ref], stdout=subprocess.PIPE)
+            file_count = extract_archive(process.stdout, local_dir)
+            if process.wait() != 0:
+                raise RuntimeError(f"git archive exited with status {process.returncode}")
+            print(f"Exported {file_count} file(s) into '{local_dir}'")
+            return True
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            return False
+
+    def apply_changes(self, old_sha, new_sha, local_dir):
+        # Same rule as the REST backend: a rewritten history gets a full export
+        ancestor = subprocess.run(['git', '--git-dir', self.mirror_dir, 'merge-base', '--is-ancestor', old_sha, new_sha],
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if ancestor.returncode != 0:
+            print(f"{old_sha[:8]} is not an ancestor of {new_sha[:8]}, exporting the full tree")
+            return False
+        try:
+            output = self.git('diff', '--name-status', '--no-renames', '-z', old_sha, new_sha)
+        except subprocess.CalledProcessError as e:
+            print(f"Failed to compare {old_sha[:8]}..{new_sha[:8]}: {e.stderr.decode(errors='replace').strip()}")
+            return False
+
+        fields = output.decode('utf-8', 'replace').split('\0')
+        changes = list(zip(fields[0::2], fields[1::2]))
+        if len(changes) > MAX_INCREMENTAL_FILES:
+            return False
+
+        root = os.path.realpath(local_dir)
+        for status, path in changes:
+            target = os.path.realpath(os.path.join(root, path))
+            if not target.startswith(root + os.sep):
+                continue
+            if status == 'D':
+                if os.path.isfile(target):
+                    os.remove(target)
+            elif not is_ignored_path(path):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(self.git('cat-file', 'blob', f'{new_sha}:{path}'))
+
+        print(f"Updated {len(changes)} changed file(s) in '{local_dir}' ({old_sha[:8]}..{new_sha[:8]})")
+        return True
+
+# Function to create the repository backend selected on the command line: 'rest' or 'git'
+def make_backend(project, backend='rest', mirror_root=None):
+    if backend == 'git':
+        return GitMirrorBackend.for_project(project, mirror_root=mirror_root)
+    return RestBackend(project)
+
+# Function to export a ref into a fresh sibling folder and swap it in for local_dir. Unpacking over
+# an earlier download would keep files the student has since deleted, and cargo test would still
+# build stale tests; the old folder's target/ is carried over so the next build stays incremental
+def export_replacing(backend, ref, local_dir, download_mode='archive', tree=None):
+    parent = os.path.dirname(os.path.abspath(local_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.download-', dir=parent)
+    try:
+        if not backend.export(ref, staging, download_mode=download_mode, tree=tree):
+            return False
+        if os.path.isdir(local_dir):
+            old_target = os.path.join(local_dir, 'target')
+            if os.path.isdir(old_target) and not os.path.exists(os.path.join(staging, 'target')):
+                os.rename(old_target, os.path.join(staging, 'target'))
+            previous = f'{staging}.previous'
+            os.rename(local_dir, previous)
+            os.rename(staging, local_dir)
+            shutil.rmtree(previous, ignore_errors=True)
+        else:
+            os.rename(staging, local_dir)
+        return True
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+# Function to download a submission only when the student pushed since the last run.
+# Unchanged repositories are skipped, changed ones are patched with only the files that changed.
+# With incremental=False the folder is always replaced; either way the manifest records the
+# commit that is now on disk, since cargo_runner.py and --resume read it
+def sync_submission(backend, ref='main', local_dir='./', head_sha=None, download_mode='archive',
+                    manifest_path=DOWNLOAD_MANIFEST, tree=None, incremental=True):
+    if head_sha is None:
+        try:
+            head_sha = backend.resolve_ref(ref)
+        except Exception as e:
+            print(f"Failed to resolve {ref}: {e}")
+            return False
+
+    key = f'{backend.name}@{ref}'
+    with MANIFEST_LOCK:
+        entry = load_manifest(manifest_path).get(key)
+
+    if incremental and entry and entry.get('local_dir') == local_dir and os.path.isdir(local_dir):
+        if entry['sha'] == head_sha:
+            print(f"No new commits since the last download ({head_sha[:8]}), skipping download")
+            return True
+        try:
+            updated = backend.apply_changes(entry['sha'], head_sha, local_dir)
+        except Exception as e:
+            print(f"An error occurred while applying changes: {e}")
+            updated = False
+        if updated:
+            update_manifest(key, {'sha': head_sha, 'local_dir': local_dir}, manifest_path)
+            return True
+
+    # Download the ref at the exact commit that was recorded
+    if not export_replacing(backend, head_sha, local_dir, download_mode=download_mode, tree=tree):
+        return False
+    update_manifest(key, {'sha': head_sha, 'local_dir': local_dir}, manifest_path)
+    return True
+
+# Function to extract the assignment type and number, e.g. ('homework', '3'), from a repository URL
+def parse_assignment(repo_url):
+    path_parts = urlparse(repo_url).path.strip('/').split('/')
+    type_string = path_parts[1].split('-')[0]
+    homework_number = path_parts[1].split('-')[-1]
+    return type_string, homework_number
+
+# Function to construct a student's repository URL, e.g. http://gitlab.cse.lehigh.edu/<user>-cse262/homework-3
+def build_repo_url(people, assignment):
+    return f"{GITLAB_URL.rstrip('/')}/{people}-cse262/{assignment}"
+
+# Function to read participant identifiers, one per line
+def read_participants(participants_file):
+    with open(participants_file) as f:
+        return [line.strip() for line in f if line.strip()]
+
+# Function to run every check against one student repository and return the results
+def check_student(gl, student_repo_url, download_mode='archive', incremental=True, backend='rest'):
+    type_string, homework_number = parse_assignment(student_repo_url)
+    assignment = f'{type_string}-{homework_number}'
+    username = urlparse(student_repo_url).path.strip('/').split('-')[0]
+
+    # Start a fresh journal entry; each stage is recorded below as it completes
+    results_store.clear_stages(username, assignment, CHECK_STAGES)
 
     # Get the project
     project = get_project(gl, student_repo_url)
 
+    # Select where commits, trees and files are read from
+    repo_backend = make_backend(project, backend)
+    repo_backend.fetch()
+
     # List available branches
     list_branches(project)
 
@@ -462,29 +1205,26 @@ def main():
     default_branch = get_default_branch(project)
     print(f"\nDefault branch detected: {default_branch}")
 
+    # Fetch the whole file tree once; the listing, required-file check and download share it
+    tree = get_tree_snapshot(project, ref=default_branch, backend=repo_backend)
+
     # List repository contents
     print(f"\nContents of the repository '{project.name}':")
-    list_repo_contents(project, ref=default_branch)
-
-
-    # result_folder = './cicd/' + {type_string}-{homework_number}
-    parsed_url = urlparse(student_repo_url)
-    path_parts = parsed_url.path.strip('/').split('/')
-    type_string = path_parts[1].split('-')[0]
-    homework_number = path_parts[1].split('-')[-1]
-    result_folder = f'./cicd/{type_string}-{homework_number}'
-    if not os.path.exists(result_folder):
-        os.makedirs(result_folder)
-
+    list_repo_contents(project, ref=default_branch, backend=repo_backend, tree=tree)
 
 
 
+    # Fetch the commit history once; every commit analysis below shares it
+    snapshot = get_commit_snapshot(project, ref=default_branch, backend=repo_backend)
+    # A failed fetch must not be graded as an empty history; the stages left undone make --resume retry
+    if snapshot is None:
+        raise RuntimeError("could not fetch the commit history")
 
     # Get commit count
-    commit_count = get_commit_count(project, ref=default_branch)
+    commit_count = get_commit_count(project, ref=default_branch, snapshot=snapshot)
 
     # List commit details
-    list_commit_details(project, ref=default_branch)
+    list_commit_details(project, ref=default_branch, snapshot=snapshot)
 
 
 
@@ -501,23 +1241,29 @@ def main():
 
 
     # Get commits per author
-    commits_per_author = get_commits_per_author(project, ref=default_branch)
+    commits_per_author = get_commits_per_author(project, ref=default_branch, snapshot=snapshot)
 
     # Get commit frequency
-    commit_frequency = get_commit_frequency(project, ref=default_branch)
+    commit_frequency = get_commit_frequency(project, ref=default_branch, snapshot=snapshot)
 
     # Check for required files
-    missing_files = check_required_files(project, ref=default_branch)
+    missing_files = check_required_files(project, ref=default_branch, backend=repo_backend, tree=tree)
 
     # List merge requests
     merge_requests = list_merge_requests(project)
+    results_store.record_stage(username, assignment, 'metadata', commit_sha=snapshot.head_sha)
 
     local_folder_name = parse_repo_url(student_repo_url)
 
-    download_project(project, ref=default_branch, folder_path='', local_dir=local_folder_name)
+    with instrumentation.stage('download'):
+        downloaded = sync_submission(repo_backend, ref=default_branch, local_dir=local_folder_name,
+                                     head_sha=snapshot.head_sha, download_mode=download_mode, tree=tree,
+                                     incremental=incremental)
+    results_store.record_stage(username, assignment, 'download', 'done' if downloaded else 'failed',
+                               commit_sha=snapshot.head_sha, error=None if downloaded else 'download failed')
 
     # List commit date range after 2024-08-15
-    filtered_commits = list_commit_date_range(project, ref=default_branch, start_date_str='2024-08-15')
+    filtered_commits = list_commit_date_range(project, ref=default_branch, start_date_str='2024-08-15', snapshot=snapshot)
 
     # # If filtered commits exist, filter them further by a specific date range
     # if filtered_commits:
@@ -526,29 +1272,244 @@ def main():
     #     filter_commits_by_date_range(filtered_commits, start_date_str, end_date_str)
     
 
-    # Check CI/CD status
-    pipelines = check_ci_status(project, ref=default_branch)
-
-    # Print CI/CD pipeline log
-
-    # if type_string is quiz, then no more print_pipeline_log
+    # Quizzes have no CI/CD pipeline, so no pipeline API calls are made for them
     if type_string != 'quiz':
-        total_tests, passed_tests, failed_tests = print_pipeline_log(project, pipelines[0].id)
+        # Check CI/CD status
+        pipelines = check_ci_status(project, ref=default_branch)
+        if pipelines is None:
+            raise RuntimeError("could not fetch the CI/CD pipelines")
+    else:
+        pipelines = []
+
+    # Print CI/CD pipeline log of the latest pipeline, if there is one
+    if pipelines:
+        ci_results = print_pipeline_log(project, pipelines[0].id)
+        if ci_results is None:
+            raise RuntimeError("could not read the CI/CD job log")
+        if ci_results == CI_NOT_READY:
+            # Grade again once the pipeline finishes; the ci stage stays open so --resume retries it
+            error = "the CI/CD test job has not finished"
+            results_store.upsert_result(username, assignment, snapshot.head_sha, repo_url=student_repo_url,
+                                        status='pending', commit_count=commit_count, missing_files=missing_files,
+                                        ci_total_tests=None, ci_passed_tests=None, ci_failed_tests=None, error=error)
+            results_store.record_stage(username, assignment, 'ci', 'pending', commit_sha=snapshot.head_sha, error=error)
+            return {
+                'username': username,
+                'url': student_repo_url,
+                'assignment': assignment,
+                'status': 'pending',
+                'commit_sha': snapshot.head_sha,
+                'commit_count': commit_count,
+                'commits_per_author': dict(commits_per_author),
+                'missing_files': missing_files,
+                'error': error,
+            }
+        total_tests, passed_tests, failed_tests, tests = ci_results
     else:
-        total_tests, passed_tests, failed_tests = 0, 0, 0
+        total_tests, passed_tests, failed_tests, tests = 0, 0, 0, []
 
 
     # total_tests, passed_tests, failed_tests = print_pipeline_log(project, pipelines[0].id)
 
 
-    with open(f'{result_folder}/results.txt', 'a') as f:
+    # Record the grade; rerunning the same commit updates its row instead of adding another one
+    results_store.upsert_result(username, assignment, snapshot.head_sha, repo_url=student_repo_url, status='ok',
+                                commit_count=commit_count, missing_files=missing_files, ci_total_tests=total_tests,
+                                ci_passed_tests=passed_tests, ci_failed_tests=failed_tests, error=None)
+    results_store.record_test_cases(username, assignment, 'ci', tests, commit_sha=snapshot.head_sha)
+    results_store.record_stage(username, assignment, 'ci', commit_sha=snapshot.head_sha)
+
+    return {
+        'username': username,
+        'url': student_repo_url,
+        'assignment': assignment,
+        'status': 'ok',
+        'commit_sha': snapshot.head_sha,
+        'commit_count': commit_count,
+        'commits_per_author': dict(commits_per_author),
+        'missing_files': missing_files,
+        'total_tests': total_tests,
+        'passed_tests': passed_tests,
+        'failed_tests': failed_tests,
+        'tests': tests,
+        'error': None,
+    }
+
+# Function to check one student inside a batch run; a failure only affects that student
+def grade_student(gl, people, assignment, **options):
+    repo_url = build_repo_url(people, assignment)
+    try:
+        with instrumentation.student(people):
+            return check_student(gl, repo_url, **options)
+    except (Exception, SystemExit) as e:
+        # get_project exits on failure; in a batch that only fails this student
+        error = f"exited with status {e.code}" if isinstance(e, SystemExit) else str(e)
+        print(f"Repo for {people} is not good! {error}")
+        results_store.upsert_result(people, assignment, repo_url=repo_url, status='error', error=error)
+        # Mark the stage the run broke off in, so --resume retries this student
+        entries = results_store.read_journal(assignment).get(people, {})
+        stage = next((stage for stage in CHECK_STAGES if entries.get(stage, {}).get('status') != 'done'), CHECK_STAGES[-1])
+        results_store.record_stage(people, assignment, stage, 'failed', error=error)
+        return {
+            'username': people,
+            'url': repo_url,
+            'assignment': assignment,
+            'status': 'error',
+            'error': error,
+        }
+
+# Routes print() output of each worker thread into its own buffer, so the logs
+# of students checked at the same time are printed one student at a time
+class ThreadOutput:
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None:
+            with self.lock:
+                return self.stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def capture(self):
+        self.local.buffer = io.StringIO()
+
+    # Stop capturing and print everything this thread wrote in one block
+    def release(self):
+        text = self.local.buffer.getvalue()
+        self.local.buffer = None
+        self.write(text)
+
+# Function to grade students with a bounded pool of worker threads
+def run_concurrently(gl, participants, assignment, workers, **options):
+    output = ThreadOutput(sys.stdout)
+
+    def grade(people):
+        output.capture()
+        try:
+            return grade_student(gl, people, assignment, **options)
+        finally:
+            output.release()
+
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(grade, participants))
+    finally:
+        sys.stdout = output.stream
+
+# Function to rebuild the result of a student checked by an earlier run from the results table
+def stored_result(row, people, assignment):
+    return {
+        'username': people,
+        'url': row.get('repo_url'),
+        'assignment': assignment,
+        'status': row.get('status', 'ok'),
+        'commit_sha': row.get('commit_sha'),
+        'commit_count': row.get('commit_count', 0),
+        'commits_per_author': {},
+        'missing_files': json.loads(row.get('missing_files') or '[]'),
+        'total_tests': row.get('ci_total_tests', 0),
+        'passed_tests': row.get('ci_passed_tests', 0),
+        'failed_tests': row.get('ci_failed_tests', 0),
+        'tests': [],
+        'error': None,
+        'resumed': True,
+    }
+
+# Function to grade every participant in one process with one authenticated, pooled connection.
+# With resume=True, students whose stages the run journal records as done are not checked again;
+# failed and missing ones are. Extra keyword options (e.g. download_mode) are passed on to check_student
+def run_batch(participants_file, assignment, gl=None, workers=1, http_cache_dir=http_cache.HTTP_CACHE_DIR,
+              resume=False, auth=True, **options):
+    participants = read_participants(participants_file)
+    pending = participants
+    if resume:
+        done = results_store.completed_students(assignment, CHECK_STAGES)
+        pending = [people for people in participants if people not in done]
+        print(f"Resuming {assignment}: {len(participants) - len(pending)} of {len(participants)} students already checked")
+
+    if pending and gl is None:
+        session = make_session(pool_size=max(workers, 10), http_cache_dir=http_cache_dir)
+        gl = init_gitlab(GITLAB_URL, PRIVATE_TOKEN, session=session, auth=auth)
+    if workers <= 1:
+        results = [grade_student(gl, people, assignment, **options) for people in pending]
+    else:
+        results = run_concurrently(gl, pending, assignment, workers, **options)
+    if not resume:
+        return results
+
+    graded = dict(zip(pending, results))
+    stored = {row['student']: row for row in results_store.grade_table(assignment)}
+    return [graded[people] if people in graded else stored_result(stored.get(people, {}), people, assignment)
+            for people in participants]
+
+# Function to print a one-line summary per student after a batch run
+def print_batch_summary(results):
+    print('\n' + '-'*50)
+    for result in results:
+        if result['status'] == 'ok':
+            resumed = ' (from an earlier run)' if result.get('resumed') else ''
+            print(f"{result['username']}: commits {result['commit_count']}, "
+                  f"tests {result['passed_tests']}/{result['total_tests']} passed{resumed}")
+        elif result['status'] == 'pending':
+            print(f"{result['username']}: PENDING {result['error']}")
+        else:
+            print(f"{result['username']}: ERROR {result['error']}")
+    print('-'*50)
 
-        username = student_repo_url.replace("http://gitlab.cse.lehigh.edu/", "").split('-')[0]
+def main():
+    parser = argparse.ArgumentParser(description="Check student GitLab repositories.")
+    parser.add_argument('student_repo_url', nargs='?', help="repository URL of a single student")
+    parser.add_argument('--batch', metavar='PARTICIPANTS', help="participants file, one username per line")
+    parser.add_argument('--assignment', help="assignment to grade in batch mode, e.g. homework-3")
+    parser.add_argument('--download-mode', choices=['archive', 'files'], default='archive',
+                        help="'archive' fetches one tar.gz per repository, 'files' fetches every file separately")
+    parser.add_argument('--backend', choices=['rest', 'git'], default='rest',
+                        help="read commits and files through the REST API or from a local bare mirror kept up to date with git fetch")
+    parser.add_argument('--full-download', action='store_true',
+                        help="download every repository again even if it has not changed since the last run")
+    parser.add_argument('--http-cache', default=http_cache.HTTP_CACHE_DIR, metavar='DIR',
+                        help="directory of the GitLab response cache")
+    parser.add_argument('--no-http-cache', action='store_true', help="send every API request without the response cache")
+    parser.add_argument('--workers', type=int, default=1, help="number of students to check at the same time in batch mode")
+    parser.add_argument('--resume', action='store_true',
+                        help="in batch mode, skip students a previous run completed and retry only failed or missing ones")
+    parser.add_argument('--skip-auth', action='store_true',
+                        help="do not verify the token with an extra request before starting (for a token known to be valid)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    http_cache_dir = None if args.no_http_cache else args.http_cache
+
+    if args.batch and not args.assignment:
+        parser.error("--batch requires --assignment")
+    if not args.batch and not args.student_repo_url:
+        parser.error("either a student repository URL or --batch is required")
+
+    with instrumentation.reporting(args):
+        if args.batch:
+            results = run_batch(args.batch, args.assignment, workers=args.workers, http_cache_dir=http_cache_dir,
+                                download_mode=args.download_mode, incremental=not args.full_download,
+                                backend=args.backend, resume=args.resume, auth=not args.skip_auth)
+            print_batch_summary(results)
+            return
 
-        f.write('-'*10 + ' ' + username + ' ' + '-'*10 + '\n')
-        f.write(f"{student_repo_url},{commit_count}\n")
-        f.write(f'all_tests,{total_tests} passed_tests,{passed_tests} failed_tests,{failed_tests}\n')
-        f.write('-'*10 + ' ' + username + ' ' + '-'*10 + '\n\n\n')
+        # Initialize GitLab connection
+        gl = init_gitlab(GITLAB_URL, PRIVATE_TOKEN, session=make_session(http_cache_dir=http_cache_dir),
+                         auth=not args.skip_auth)
+
+        with instrumentation.student(urlparse(args.student_repo_url).path.strip('/').split('-')[0]):
+            try:
+                check_student(gl, args.student_repo_url, download_mode=args.download_mode,
+                              incremental=not args.full_download, backend=args.backend)
+            except RuntimeError as e:
+                print(f"Check failed: {e}")
+                sys.exit(1)
 
 
 
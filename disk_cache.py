@@ -0,0 +1,67 @@
+import os
+
+
+# Evicting down to this share of the limit leaves room, so a full cache is not pruned on every store
+EVICT_FRACTION = 0.9
+
+
+# Size accounting and least recently used eviction for a cache directory, shared by HttpCache and
+# ResultCache. Every entry is one '<key><suffix>' file: its size counts towards max_bytes and its
+# mtime is the LRU clock. Companion files of an entry (e.g. HttpCache's '.json' metadata) are
+# removed with it. Not thread-safe; a cache used from several threads calls it under its own lock
+class LruDirectory:
+    def __init__(self, directory, suffix, max_bytes, companions=()):
+        self.directory = directory
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.companions = tuple(companions)
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self.entries())
+
+    def path(self, key, suffix=None):
+        return os.path.join(self.directory, key + (self.suffix if suffix is None else suffix))
+
+    # Move a fully written temporary file into place as the entry of key. An overwritten entry no
+    # longer counts towards the total; returns True when the directory is now over its limit
+    def replace(self, temp_path, key):
+        path = self.path(key)
+        try:
+            self.total_bytes -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(temp_path, path)
+        self.total_bytes += os.path.getsize(path)
+        return self.total_bytes > self.max_bytes
+
+    # Mark an entry as just used; returns False if it no longer exists
+    def touch(self, key):
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    # (key, size, last used) of every entry
+    def entries(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                yield name[:-len(self.suffix)], stat.st_size, stat.st_mtime
+
+    # Remove least recently used entries until the directory is back under EVICT_FRACTION of its limit
+    def evict(self):
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes * EVICT_FRACTION:
+                break
+            for suffix in (self.suffix, *self.companions):
+                try:
+                    os.remove(self.path(key, suffix))
+                except FileNotFoundError:
+                    pass
+            total -= size
+        self.total_bytes = total
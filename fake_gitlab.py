@@ -0,0 +1,412 @@
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import tarfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+
+# Stand-in for the parts of the GitLab v4 API that check_repo.py uses, serving generated
+# projects so the grading pipeline can be timed without gitlab.cse.lehigh.edu. It answers
+# pagination (Link/X-Next-Page headers), ETag revalidation, tar.gz archives, compare and job traces.
+# It can also play GitLab's webhooks, posting push and pipeline events to a grading_service.py
+
+# GitLab's default and maximum page sizes
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+# Source folders a generated submission spreads its files over
+FIXTURE_FOLDERS = ['src', 'src/lexer', 'src/parser', 'tests', 'examples']
+
+
+def make_sha(*parts):
+    return hashlib.sha1('/'.join(str(part) for part in parts).encode()).hexdigest()
+
+def parse_date(text):
+    moment = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+def format_date(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.000%z')[:-2] + ':' + moment.strftime('%z')[-2:]
+
+
+# One generated student repository: files at the head commit, commit history, pipelines and job trace
+class FixtureProject:
+    def __init__(self, project_id, username, assignment, files=40, file_size=2048, commits=30, tests=25,
+                 failed_tests=2, trace_kb=64, seed=0):
+        rng = random.Random(f'{seed}/{username}/{assignment}')
+        self.id = project_id
+        self.path_with_namespace = f'{username}-cse262/{assignment}'
+        self.username = username
+        self.assignment = assignment
+
+        self.files = {'Cargo.toml': f'[package]\nname = "{assignment.replace("-", "_")}"\nversion = "0.1.0"\n'
+                                    f'edition = "2021"\n\n[dependencies]\n'.encode()}
+        for index in range(max(files - 1, 0)):
+            folder = FIXTURE_FOLDERS[index % len(FIXTURE_FOLDERS)]
+            self.files[f'{folder}/file_{index}.rs'] = self.source(rng, file_size)
+
+        start = datetime(2024, 9, 1, 12, 0, tzinfo=timezone(timedelta(hours=-4)))
+        self.commits = []
+        for index in range(commits):
+            moment = start + timedelta(hours=rng.randint(1, 20) * index)
+            self.commits.insert(0, self.commit(make_sha(self.path_with_namespace, index), moment,
+                                               f'Work on {assignment}, step {index}'))
+        # Files changed by each commit after the initial history, for the compare API
+        self.changes = {}
+
+        self.pipelines = [{'id': project_id * 1000 + index, 'status': 'success' if index else 'failed',
+                           'ref': 'main', 'sha': self.head_sha, 'created_at': self.commits[0]['created_at']}
+                          for index in range(3, 0, -1)]
+        self.jobs = [{'id': project_id * 1000 + offset, 'name': name, 'stage': stage, 'status': 'success'}
+                     for offset, (name, stage) in enumerate([('build', 'build'), ('test', 'test')])]
+        self.trace = self.cargo_trace(rng, tests, failed_tests, trace_kb)
+
+    @staticmethod
+    def source(rng, size):
+        lines = []
+        while sum(len(line) for line in lines) < size:
+            lines.append(f'fn item_{rng.randrange(10**6)}(x: i64) -> i64 {{ x * {rng.randrange(100)} }}\n')
+        return ''.join(lines).encode()
+
+    def commit(self, sha, moment, message):
+        return {'id': sha, 'short_id': sha[:8], 'title': message, 'message': message,
+                'author_name': self.username, 'author_email': f'{self.username}@lehigh.edu',
+                'created_at': format_date(moment), 'committed_date': format_date(moment), 'parent_ids': []}
+
+    # A cargo test log padded with build output to roughly trace_kb kilobytes
+    @staticmethod
+    def cargo_trace(rng, tests, failed_tests, trace_kb):
+        lines = [f'   Compiling crate_{index} v0.{rng.randrange(10)}.0\n' for index in range(trace_kb * 1024 // 40)]
+        lines.append('     Running unittests src/lib.rs (target/debug/deps/grading-0123456789abcdef)\n')
+        lines.append(f'\nrunning {tests} tests\n')
+        for index in range(tests):
+            outcome = 'FAILED' if index < failed_tests else 'ok'
+            lines.append(f'test tests::case_{index} ... {outcome}\n')
+        result = 'FAILED' if failed_tests else 'ok'
+        lines.append(f'\ntest result: {result}. {tests - failed_tests} passed; {failed_tests} failed; 0 ignored; '
+                     f'0 measured; 0 filtered out; finished in 0.01s\n\n')
+        lines.append('   Doc-tests grading\n\nrunning 0 tests\n\ntest result: ok. 0 passed; 0 failed; 0 ignored; '
+                     '0 measured; 0 filtered out; finished in 0.00s\n')
+        return ''.join(lines).encode()
+
+    @property
+    def head_sha(self):
+        return self.commits[0]['id']
+
+    def project_json(self, base_url):
+        name = self.assignment
+        return {'id': self.id, 'name': name, 'path': name, 'path_with_namespace': self.path_with_namespace,
+                'name_with_namespace': self.path_with_namespace, 'default_branch': 'main',
+                'http_url_to_repo': f'{base_url}/{self.path_with_namespace}.git',
+                'web_url': f'{base_url}/{self.path_with_namespace}', 'last_activity_at': self.commits[0]['created_at']}
+
+    def tree(self, path='', recursive=False):
+        entries = {}
+        for file_path in self.files:
+            parts = file_path.split('/')
+            for depth in range(1, len(parts) + 1):
+                entry_path = '/'.join(parts[:depth])
+                entry_type = 'blob' if depth == len(parts) else 'tree'
+                entries[entry_path] = {'id': make_sha(self.head_sha, entry_path), 'name': parts[depth - 1],
+                                       'type': entry_type, 'path': entry_path,
+                                       'mode': '100644' if entry_type == 'blob' else '040000'}
+        prefix = f"{path.strip('/')}/" if path.strip('/') else ''
+        items = []
+        for entry_path, entry in entries.items():
+            if not entry_path.startswith(prefix):
+                continue
+            if not recursive and '/' in entry_path[len(prefix):]:
+                continue
+            items.append(entry)
+        return sorted(items, key=lambda entry: (entry['type'] != 'tree', entry['path']))
+
+    def archive(self):
+        buffer = io.BytesIO()
+        top = f'{self.assignment}-{self.head_sha}-{self.head_sha}'
+        with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+            for file_path, content in self.files.items():
+                info = tarfile.TarInfo(f'{top}/{file_path}')
+                info.size = len(content)
+                info.mtime = 1725206400
+                archive.addfile(info, io.BytesIO(content))
+        return buffer.getvalue()
+
+    # Simulate a push: a new head commit that rewrites `count` files
+    def push(self, count=1):
+        rng = random.Random(f'{self.head_sha}/push')
+        changed = sorted(path for path in self.files if path.endswith('.rs'))[:count]
+        for file_path in changed:
+            self.files[file_path] = self.source(rng, len(self.files[file_path]))
+        moment = datetime.now(timezone(timedelta(hours=-4)))
+        sha = make_sha(self.head_sha, 'push', len(self.commits))
+        self.commits.insert(0, self.commit(sha, moment, f'Update {len(changed)} file(s)'))
+        self.changes[sha] = changed
+        for pipeline in self.pipelines:
+            pipeline['sha'] = sha
+
+    # Webhook payloads, trimmed to the fields GitLab always sends
+    def push_hook(self, base_url, ref='refs/heads/main'):
+        return {'object_kind': 'push', 'ref': ref, 'before': self.commits[1]['id'] if len(self.commits) > 1 else '',
+                'after': self.head_sha, 'user_username': self.username, 'project_id': self.id,
+                'project': self.project_json(base_url), 'commits': self.commits[:1],
+                'total_commits_count': 1}
+
+    def pipeline_hook(self, base_url, status='success'):
+        pipeline = self.pipelines[0]
+        return {'object_kind': 'pipeline',
+                'object_attributes': {'id': pipeline['id'], 'ref': 'main', 'sha': pipeline['sha'], 'status': status},
+                'project': self.project_json(base_url)}
+
+    def compare(self, from_sha, to_sha):
+        shas = [commit['id'] for commit in self.commits]
+        if from_sha not in shas or to_sha not in shas:
+            return None
+        newer = shas[shas.index(to_sha):shas.index(from_sha)]
+        changed = sorted({path for sha in newer for path in self.changes.get(sha, [])})
+        return {'commit': self.commits[shas.index(to_sha)], 'commits': [self.commits[shas.index(sha)] for sha in newer],
+                'diffs': [{'old_path': path, 'new_path': path, 'new_file': False, 'renamed_file': False,
+                           'deleted_file': False, 'diff': ''} for path in changed],
+                'compare_timeout': False, 'compare_same_ref': from_sha == to_sha}
+
+
+# A roster of generated projects plus request counters, shared by every server thread
+class FakeGitLab:
+    def __init__(self, participants, assignment, latency=0.0, seed=0, **fixture_options):
+        self.latency = latency
+        self.projects = {}
+        for index, username in enumerate(participants, start=1):
+            project = FixtureProject(index, username, assignment, seed=seed, **fixture_options)
+            self.projects[project.path_with_namespace] = project
+            self.projects[str(project.id)] = project
+        self.archives = {}
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.bytes_sent = 0
+
+    def count(self, endpoint, size):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.bytes_sent += size
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = {}
+            self.bytes_sent = 0
+
+    def archive(self, project):
+        key = (project.id, project.head_sha)
+        if key not in self.archives:
+            self.archives[key] = project.archive()
+        return self.archives[key]
+
+    # Start serving on a free local port in a background thread
+    def start(self, host='127.0.0.1', port=0):
+        handler = type('Handler', (FakeGitLabHandler,), {'gitlab': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.url = f'http://{host}:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Function to POST a webhook the way GitLab does, e.g. to a grading_service.py endpoint; returns (status, reply)
+def send_webhook(url, event, payload, token=None):
+    headers = {'Content-Type': 'application/json', 'X-Gitlab-Event': event}
+    if token:
+        headers['X-Gitlab-Token'] = token
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'null')
+
+
+ROUTES = [
+    ('user', re.compile(r'^/api/v4/user$')),
+    ('projects', re.compile(r'^/api/v4/projects$')),
+    ('project', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)$')),
+    ('branches', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/repository/branches$')),
+    ('tree', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/repository/tree$')),
+    ('commits', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/repository/commits$')),
+    ('commit', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/repository/commits/(?P<sha>[^/]+)$')),
+    ('compare', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/repository/compare$')),
+    ('merge_base', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/repository/merge_base$')),
+    ('archive', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/repository/archive(?:\.tar\.gz)?$')),
+    ('file_raw', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/repository/files/(?P<path>[^/]+)/raw$')),
+    ('file', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/repository/files/(?P<path>[^/]+)$')),
+    ('merge_requests', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/merge_requests$')),
+    ('pipelines', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/pipelines$')),
+    ('jobs', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/pipelines/(?P<pipeline>\d+)/jobs$')),
+    ('trace', re.compile(r'^/api/v4/projects/(?P<id>[^/]+)/jobs/(?P<job>\d+)/trace$')),
+]
+
+
+class FakeGitLabHandler(BaseHTTPRequestHandler):
+    gitlab = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.gitlab.latency:
+            time.sleep(self.gitlab.latency)
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        for endpoint, pattern in ROUTES:
+            match = pattern.match(url.path)
+            if match:
+                break
+        else:
+            return self.send_json({'message': '404 Not Found'}, status=404, endpoint='unknown')
+
+        params = {key: unquote(value) for key, value in match.groupdict().items()}
+        if endpoint == 'user':
+            return self.send_json({'id': 1, 'username': 'grader'}, endpoint=endpoint)
+        if endpoint == 'projects':
+            return self.get_projects(query, endpoint)
+        project = self.gitlab.projects.get(params['id'])
+        if project is None:
+            return self.send_json({'message': '404 Project Not Found'}, status=404, endpoint=endpoint)
+        handler = getattr(self, f'get_{endpoint}')
+        return handler(project, query, params, endpoint)
+
+    # Project listing with the search and last_activity_after filters, most recently active first
+    def get_projects(self, query, endpoint):
+        projects = {project.id: project.project_json(self.base_url()) for project in self.gitlab.projects.values()}
+        listed = [project for project in projects.values() if query.get('search', '') in project['path_with_namespace']]
+        if 'last_activity_after' in query:
+            after = parse_date(query['last_activity_after'])
+            listed = [project for project in listed if parse_date(project['last_activity_at']) > after]
+        listed.sort(key=lambda project: parse_date(project['last_activity_at']), reverse=True)
+        self.send_page(listed, query, endpoint)
+
+    def get_project(self, project, query, params, endpoint):
+        self.send_json(project.project_json(self.base_url()), endpoint=endpoint)
+
+    def get_branches(self, project, query, params, endpoint):
+        self.send_page([{'name': 'main', 'default': True, 'commit': project.commits[0]}], query, endpoint)
+
+    def get_tree(self, project, query, params, endpoint):
+        recursive = query.get('recursive', 'false').lower() == 'true'
+        self.send_page(project.tree(query.get('path', ''), recursive=recursive), query, endpoint)
+
+    def get_commits(self, project, query, params, endpoint):
+        commits = project.commits
+        if 'since' in query:
+            since = parse_date(query['since'])
+            commits = [commit for commit in commits if parse_date(commit['committed_date']) >= since]
+        if 'until' in query:
+            until = parse_date(query['until'])
+            commits = [commit for commit in commits if parse_date(commit['committed_date']) <= until]
+        self.send_page(commits, query, endpoint)
+
+    def get_commit(self, project, query, params, endpoint):
+        ref = 'main' if params['sha'] in ('main', 'HEAD') else params['sha']
+        commit = project.commits[0] if ref == 'main' else next((c for c in project.commits if c['id'] == ref), None)
+        if commit is None:
+            return self.send_json({'message': '404 Commit Not Found'}, status=404, endpoint=endpoint)
+        self.send_json(commit, endpoint=endpoint)
+
+    def get_compare(self, project, query, params, endpoint):
+        comparison = project.compare(query.get('from', ''), query.get('to', ''))
+        if comparison is None:
+            return self.send_json({'message': '404 Ref Not Found'}, status=404, endpoint=endpoint)
+        self.send_json(comparison, endpoint=endpoint)
+
+    # The history is linear, so the merge base of known commits is the oldest of them
+    def get_merge_base(self, project, query, params, endpoint):
+        shas = [commit['id'] for commit in project.commits]
+        refs = parse_qs(urlparse(self.path).query).get('refs[]', [])
+        if not refs or any(ref not in shas for ref in refs):
+            return self.send_json({'message': '404 Not Found'}, status=404, endpoint=endpoint)
+        self.send_json(project.commits[max(shas.index(ref) for ref in refs)], endpoint=endpoint)
+
+    def get_archive(self, project, query, params, endpoint):
+        self.send_body(self.gitlab.archive(project), 'application/octet-stream', endpoint=endpoint)
+
+    def get_file(self, project, query, params, endpoint):
+        content = project.files.get(params['path'])
+        if content is None:
+            return self.send_json({'message': '404 File Not Found'}, status=404, endpoint=endpoint)
+        self.send_json({'file_name': params['path'].rsplit('/', 1)[-1], 'file_path': params['path'],
+                        'size': len(content), 'encoding': 'base64', 'ref': query.get('ref', 'main'),
+                        'content': base64.b64encode(content).decode(), 'last_commit_id': project.head_sha},
+                       endpoint=endpoint)
+
+    def get_file_raw(self, project, query, params, endpoint):
+        content = project.files.get(params['path'])
+        if content is None:
+            return self.send_json({'message': '404 File Not Found'}, status=404, endpoint=endpoint)
+        self.send_body(content, 'text/plain', endpoint=endpoint)
+
+    def get_merge_requests(self, project, query, params, endpoint):
+        merge_requests = [{'iid': 1, 'title': 'Submit assignment', 'state': 'merged',
+                           'author': {'name': project.username}}]
+        self.send_page(merge_requests, query, endpoint)
+
+    def get_pipelines(self, project, query, params, endpoint):
+        pipelines = sorted(project.pipelines, key=lambda pipeline: pipeline['id'], reverse=query.get('sort') != 'asc')
+        self.send_page(pipelines, query, endpoint)
+
+    def get_jobs(self, project, query, params, endpoint):
+        self.send_page(project.jobs, query, endpoint)
+
+    def get_trace(self, project, query, params, endpoint):
+        self.send_body(project.trace, 'text/plain', endpoint=endpoint)
+
+    def base_url(self):
+        return f"http://{self.headers.get('Host', '127.0.0.1')}"
+
+    # Offset pagination with the headers python-gitlab follows when asked for all=True
+    def send_page(self, items, query, endpoint):
+        per_page = min(int(query.get('per_page', DEFAULT_PER_PAGE)), MAX_PER_PAGE)
+        page = max(int(query.get('page', 1)), 1)
+        total_pages = max((len(items) + per_page - 1) // per_page, 1)
+        headers = {'X-Page': str(page), 'X-Per-Page': str(per_page), 'X-Total': str(len(items)),
+                   'X-Total-Pages': str(total_pages), 'X-Next-Page': str(page + 1) if page < total_pages else ''}
+        if page < total_pages:
+            next_query = dict(query, page=str(page + 1), per_page=str(per_page))
+            next_url = f"{self.base_url()}{urlparse(self.path).path}?" + '&'.join(
+                f'{key}={quote(value)}' for key, value in next_query.items())
+            headers['Link'] = f'<{next_url}>; rel="next"'
+        self.send_json(items[(page - 1) * per_page:page * per_page], endpoint=endpoint, headers=headers)
+
+    def send_json(self, payload, status=200, endpoint='', headers=None):
+        self.send_body(json.dumps(payload).encode(), 'application/json', status=status, endpoint=endpoint,
+                       headers=headers)
+
+    # Every 200 carries an ETag; a matching If-None-Match is answered with a bodyless 304
+    def send_body(self, body, content_type, status=200, endpoint='', headers=None):
+        etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.gitlab.count(endpoint, 0)
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.gitlab.count(endpoint, len(body))
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if status == 200:
+            self.send_header('ETag', etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,351 @@
+import argparse
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import check_repo
+import http_cache
+import instrumentation
+
+
+# Seconds a regrade waits after the first event for a student, so a burst of pushes (and the
+# pipeline they start) is graded once, at the newest commit
+REGRADE_DELAY = 10
+
+# Seconds between two polls of last_activity_at, the fallback for missed or disabled webhooks; 0 disables polling
+POLL_INTERVAL = 300
+
+# Last seen activity of every project, so a restarted service only regrades what changed meanwhile
+POLL_STATE = '.grading-service-state.json'
+
+# Pipeline webhook statuses after which the CI results of a commit no longer change
+FINISHED_PIPELINE_STATUSES = ('success', 'failed', 'canceled', 'skipped')
+
+# Student projects are named <student>-cse262/<assignment>, see check_repo.build_repo_url
+PROJECT_PATH_PATTERN = re.compile(r'^(?P<student>[^/]+)-cse262/(?P<assignment>[^/]+)$')
+
+
+# Function to find the (student, assignment) a GitLab push or pipeline webhook is about.
+# Returns (key, reason); key is None when the event does not call for a regrade
+def parse_hook(event, payload):
+    project = payload.get('project') or {}
+    path = project.get('path_with_namespace', '')
+    match = PROJECT_PATH_PATTERN.match(path)
+    if not match:
+        return None, f"not a student project: {path or '?'}"
+    key = (match['student'], match['assignment'])
+
+    if event == 'Push Hook':
+        branch = payload.get('ref', '').replace('refs/heads/', '', 1)
+        if branch != project.get('default_branch', 'main'):
+            return None, f"push to {branch}, not the default branch"
+        return key, f"push {(payload.get('after') or '')[:8]}"
+    if event == 'Pipeline Hook':
+        attributes = payload.get('object_attributes') or {}
+        status = attributes.get('status')
+        if status not in FINISHED_PIPELINE_STATUSES:
+            return None, f"pipeline {status}"
+        return key, f"pipeline {attributes.get('id')} {status}"
+    return None, f"unhandled event: {event or '?'}"
+
+
+# Pending regrades keyed by (student, assignment). An event for a key that is already waiting
+# is merged into it, and a key being graded is not handed to a second worker; an event that
+# arrives while it is graded queues one more run, which then sees the newer commit
+class RegradeQueue:
+    def __init__(self, delay=REGRADE_DELAY):
+        self.delay = delay
+        self.condition = threading.Condition()
+        self.pending = {}
+        self.running = set()
+        self.started = {}
+        self.closed = False
+        self.counts = {'events': 0, 'merged': 0, 'graded': 0}
+
+    def put(self, key, reason):
+        with self.condition:
+            self.counts['events'] += 1
+            if key in self.pending:
+                self.counts['merged'] += 1
+                self.pending[key][1].append(reason)
+            else:
+                self.pending[key] = (time.monotonic() + self.delay, [reason])
+            self.condition.notify_all()
+
+    # Block until a key is due and not being graded; returns (key, reasons), or None once closed
+    def get(self):
+        with self.condition:
+            while not self.closed:
+                waiting = [(due, key) for key, (due, _) in self.pending.items() if key not in self.running]
+                if not waiting:
+                    self.condition.wait()
+                    continue
+                due, key = min(waiting)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+                _, reasons = self.pending.pop(key)
+                self.running.add(key)
+                self.started[key] = datetime.now(timezone.utc)
+                return key, reasons
+            return None
+
+    def done(self, key):
+        with self.condition:
+            self.running.discard(key)
+            self.counts['graded'] += 1
+            self.condition.notify_all()
+
+    # When the latest grade of a key began, or None if it was not graded by this process
+    def started_at(self, key):
+        with self.condition:
+            return self.started.get(key)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def status(self):
+        with self.condition:
+            return dict(self.counts, pending=len(self.pending), running=len(self.running))
+
+
+# Function to load the last seen activity of every project
+def load_poll_state(state_path=POLL_STATE):
+    if not os.path.exists(state_path):
+        return {'polled_at': None, 'projects': {}}
+    with open(state_path) as f:
+        return json.load(f)
+
+# Function to save the poll state atomically
+def save_poll_state(state, state_path=POLL_STATE):
+    temp_path = f'{state_path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, state_path)
+
+
+# Fallback for missed webhooks: lists the projects of each assignment with one paginated
+# request and queues those whose last_activity_at differs from the previous poll. After the
+# first poll only projects active since then are listed. GitLab refreshes last_activity_at
+# at most about once an hour, so polling bounds the delay of a missed webhook, not more
+class ActivityPoller:
+    def __init__(self, gl, roster, queue, state_path=POLL_STATE):
+        self.gl = gl
+        self.roster = roster
+        self.queue = queue
+        self.state_path = state_path
+        self.state = load_poll_state(state_path)
+
+    def poll(self):
+        polled_at = datetime.now(timezone.utc)
+        options = {}
+        if self.state['polled_at']:
+            # Overlap the previous poll so an activity stamped while it ran is not missed
+            since = datetime.fromisoformat(self.state['polled_at']) - timedelta(minutes=5)
+            options['last_activity_after'] = since.isoformat()
+        queued = 0
+        for assignment in sorted({assignment for _, assignment in self.roster}):
+            projects = self.gl.projects.list(search=assignment, membership=True, simple=True,
+                                             per_page=check_repo.API_PAGE_SIZE, get_all=True, **options)
+            for project in projects:
+                match = PROJECT_PATH_PATTERN.match(project.path_with_namespace)
+                key = (match['student'], match['assignment']) if match else None
+                if key not in self.roster:
+                    continue
+                activity = project.last_activity_at
+                if self.state['projects'].get(project.path_with_namespace) == activity:
+                    continue
+                self.state['projects'][project.path_with_namespace] = activity
+                if not self.graded_since(key, activity):
+                    self.queue.put(key, f"activity {activity}")
+                    queued += 1
+        self.state['polled_at'] = polled_at.isoformat()
+        save_poll_state(self.state, self.state_path)
+        return queued
+
+    # Whether a grade that began after the given activity (usually started by its webhook) has already seen it
+    def graded_since(self, key, activity):
+        started = self.queue.started_at(key)
+        try:
+            return started is not None and check_repo.parse_commit_date(activity) <= started
+        except ValueError:
+            return False
+
+
+# Long-running grader: a webhook endpoint and an optional poller feed a RegradeQueue, and a
+# pool of worker threads grades each queued student with check_repo.grade_student, so results.db
+# follows pushes as they happen instead of waiting for the next full sweep of the roster
+class GradingService:
+    def __init__(self, gl, roster, workers=4, secret=None, delay=REGRADE_DELAY, poll_interval=POLL_INTERVAL,
+                 state_path=POLL_STATE, **options):
+        self.gl = gl
+        self.roster = roster
+        self.workers = workers
+        self.secret = secret
+        self.poll_interval = poll_interval
+        self.options = options
+        self.queue = RegradeQueue(delay=delay)
+        self.poller = ActivityPoller(gl, roster, self.queue, state_path=state_path)
+        self.stopping = threading.Event()
+        self.threads = []
+
+    # Start the webhook endpoint, the workers and the poller; returns the webhook URL
+    def start(self, host='127.0.0.1', port=8262):
+        handler = type('Handler', (WebhookHandler,), {'service': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.output = check_repo.ThreadOutput(sys.stdout)
+        sys.stdout = self.output
+        targets = [self.server.serve_forever] + [self.work] * self.workers
+        if self.poll_interval:
+            targets.append(self.poll)
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return f'http://{host}:{self.server.server_address[1]}/'
+
+    # Stop taking events, let running grades finish and drop the ones still waiting
+    def stop(self):
+        self.stopping.set()
+        self.server.shutdown()
+        self.server.server_close()
+        self.queue.close()
+        for thread in self.threads:
+            thread.join()
+        sys.stdout = self.output.stream
+
+    def enqueue(self, key, reason):
+        if key not in self.roster:
+            return False
+        self.queue.put(key, reason)
+        return True
+
+    def work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            (student, assignment), reasons = item
+            self.output.capture()
+            try:
+                print(f"Regrading {student} {assignment} ({', '.join(reasons)})")
+                result = check_repo.grade_student(self.gl, student, assignment, **self.options)
+                if result['status'] == 'ok':
+                    print(f"{student} {assignment}: commits {result['commit_count']}, "
+                          f"tests {result['passed_tests']}/{result['total_tests']} passed")
+                elif result['status'] == 'pending':
+                    print(f"{student} {assignment}: PENDING {result['error']}")
+                else:
+                    print(f"{student} {assignment}: ERROR {result['error']}")
+            finally:
+                self.output.release()
+                self.queue.done((student, assignment))
+
+    def poll(self):
+        while not self.stopping.is_set():
+            try:
+                queued = self.poller.poll()
+                if queued:
+                    print(f"Poll found activity in {queued} project(s)")
+            except Exception as e:
+                print(f"Polling GitLab failed: {e}")
+            self.stopping.wait(self.poll_interval)
+
+
+# Accepts GitLab push and pipeline webhooks (POST, any path) and reports the queue on GET /status.
+# Events that need no regrade are still answered 200, since GitLab disables hooks that keep failing
+class WebhookHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        secret = self.service.secret
+        if secret and not hmac.compare_digest(self.headers.get('X-Gitlab-Token', ''), secret):
+            return self.send_json({'error': 'invalid token'}, status=401)
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError:
+            return self.send_json({'error': 'payload is not JSON'}, status=400)
+
+        key, reason = parse_hook(self.headers.get('X-Gitlab-Event', ''), payload)
+        if key is None:
+            return self.send_json({'ignored': reason})
+        if not self.service.enqueue(key, reason):
+            return self.send_json({'ignored': f"{key[0]} {key[1]} is not on the roster"})
+        self.send_json({'queued': list(key), 'reason': reason}, status=202)
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/status':
+            return self.send_json({'error': 'not found'}, status=404)
+        self.send_json(self.service.queue.status())
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Regrade students as they push: serve GitLab webhooks and poll project activity as a fallback.")
+    parser.add_argument('--participants', default='participants.txt', help="participants file, one username per line")
+    parser.add_argument('--assignment', action='append', required=True,
+                        help="assignment to keep graded, e.g. homework-3; repeat for several")
+    parser.add_argument('--host', default='127.0.0.1', help="address the webhook endpoint listens on")
+    parser.add_argument('--port', type=int, default=8262, help="port of the webhook endpoint")
+    parser.add_argument('--secret', default=os.environ.get('GRADING_WEBHOOK_SECRET'),
+                        help="secret token configured on the GitLab webhooks (default: $GRADING_WEBHOOK_SECRET)")
+    parser.add_argument('--workers', type=int, default=4, help="number of students graded at the same time")
+    parser.add_argument('--delay', type=float, default=REGRADE_DELAY,
+                        help="seconds to wait after an event so that bursts of pushes are graded once")
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL,
+                        help="seconds between polls of project activity; 0 relies on webhooks only")
+    parser.add_argument('--state', default=POLL_STATE, help="file keeping the last seen project activity")
+    parser.add_argument('--download-mode', choices=['archive', 'files'], default='archive')
+    parser.add_argument('--backend', choices=['rest', 'git'], default='rest')
+    parser.add_argument('--http-cache', default=http_cache.HTTP_CACHE_DIR, metavar='DIR',
+                        help="directory of the GitLab response cache")
+    parser.add_argument('--no-http-cache', action='store_true', help="send every API request without the response cache")
+    parser.add_argument('--skip-auth', action='store_true', help="do not verify the token before starting")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    participants = check_repo.read_participants(args.participants)
+    roster = {(people, assignment) for assignment in args.assignment for people in participants}
+    with instrumentation.reporting(args):
+        session = check_repo.make_session(pool_size=max(args.workers, 10),
+                                          http_cache_dir=None if args.no_http_cache else args.http_cache)
+        gl = check_repo.init_gitlab(check_repo.GITLAB_URL, check_repo.PRIVATE_TOKEN, session=session,
+                                    auth=not args.skip_auth)
+        service = GradingService(gl, roster, workers=args.workers, secret=args.secret, delay=args.delay,
+                                 poll_interval=args.poll_interval, state_path=args.state,
+                                 download_mode=args.download_mode, backend=args.backend)
+        url = service.start(args.host, args.port)
+        print(f"Listening for GitLab webhooks on {url} ({len(roster)} student repositories); press Ctrl-C to stop")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print("Stopping: finishing the grades in progress")
+        finally:
+            service.stop()
+        print(f"Regrade queue: {json.dumps(service.queue.status())}")
+
+
+if __name__ == "__main__":
+    main()
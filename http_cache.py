@@ -0,0 +1,156 @@
+import disk_cache
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+
+# On-disk cache of GitLab API responses, shared by every run
+HTTP_CACHE_DIR = '.http-cache'
+
+# Entries younger than their TTL are served without any request; older ones are revalidated
+# with If-None-Match / If-Modified-Since, which costs a 304 with no body when nothing changed.
+# Rules are (URL pattern, seconds), first match wins. The default of 0 always revalidates, so
+# a student's last push before the deadline is never missed
+HTTP_CACHE_TTL_RULES = []
+HTTP_CACHE_DEFAULT_TTL = 0
+
+# Least recently used entries are evicted once the cache grows past this size
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+# Persistent response store: '<key>.json' holds status, headers and validators, '<key>.body' the body
+class HttpCache:
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, ttl_rules=None, default_ttl=HTTP_CACHE_DEFAULT_TTL,
+                 max_bytes=HTTP_CACHE_MAX_BYTES):
+        self.ttl_rules = [(re.compile(pattern), ttl) for pattern, ttl in
+                          (HTTP_CACHE_TTL_RULES if ttl_rules is None else ttl_rules)]
+        self.default_ttl = default_ttl
+        self.lock = threading.Lock()
+        self.stats = {'fresh': 0, 'revalidated': 0, 'miss': 0}
+        # The bodies are the LRU entries; their metadata is evicted along with them
+        self.files = disk_cache.LruDirectory(cache_dir, '.body', max_bytes, companions=['.json'])
+
+    # The token is part of the key, so users with different access never share entries
+    def key(self, request):
+        token = request.headers.get('PRIVATE-TOKEN') or request.headers.get('Authorization') or ''
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        return hashlib.sha256(f'{request.method} {request.url} {token_hash}'.encode()).hexdigest()
+
+    def ttl(self, url):
+        for pattern, ttl in self.ttl_rules:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    # Both files are read and replaced under the lock, so a reader never pairs the headers
+    # (ETag, Link, pagination) of one response with the body of another
+    def load(self, key):
+        try:
+            with self.lock:
+                with open(self.files.path(key, '.json')) as f:
+                    meta = json.load(f)
+                with open(self.files.path(key), 'rb') as f:
+                    body = f.read()
+        except (FileNotFoundError, ValueError):
+            return None, None
+        return meta, body
+
+    def store(self, key, response):
+        meta = {
+            'url': response.url,
+            'status_code': response.status_code,
+            'headers': dict(response.headers),
+            'stored_at': time.time(),
+        }
+        body = response.content
+        suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        body_path = self.files.path(key)
+        meta_path = self.files.path(key, '.json')
+        with open(body_path + suffix, 'wb') as f:
+            f.write(body)
+        with open(meta_path + suffix, 'w') as f:
+            json.dump(meta, f)
+        with self.lock:
+            over_limit = self.files.replace(body_path + suffix, key)
+            os.replace(meta_path + suffix, meta_path)
+            if over_limit:
+                self.files.evict()
+
+    # Mark an entry as just validated; the body file's mtime doubles as the LRU clock
+    def touch(self, key, meta):
+        meta['stored_at'] = time.time()
+        meta_path = self.files.path(key, '.json')
+        temp_path = f'{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        with self.lock:
+            # The entry may have been evicted since it was loaded
+            if not self.files.touch(key):
+                os.remove(temp_path)
+                return
+            os.replace(temp_path, meta_path)
+
+    def count(self, outcome):
+        with self.lock:
+            self.stats[outcome] += 1
+
+
+# Transport adapter that answers GET requests from an HttpCache and revalidates stale entries
+# with conditional requests. Everything else, including streamed downloads such as archives and
+# job traces, is passed straight to the wrapped adapter. requests is imported where it is used,
+# so that importing this module stays cheap for commands that never reach GitLab
+class CachingAdapter:
+    def __init__(self, adapter, cache):
+        self.adapter = adapter
+        self.cache = cache
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != 'GET' or stream:
+            return self.adapter.send(request, stream=stream, **kwargs)
+
+        key = self.cache.key(request)
+        meta, body = self.cache.load(key)
+        if meta is not None and time.time() - meta['stored_at'] < self.cache.ttl(request.url):
+            self.cache.count('fresh')
+            return self.build_response(request, meta, body)
+
+        if meta is not None:
+            from requests.structures import CaseInsensitiveDict
+            headers = CaseInsensitiveDict(meta['headers'])
+            if 'ETag' in headers:
+                request.headers['If-None-Match'] = headers['ETag']
+            if 'Last-Modified' in headers:
+                request.headers['If-Modified-Since'] = headers['Last-Modified']
+
+        response = self.adapter.send(request, stream=stream, **kwargs)
+        if response.status_code == 304 and meta is not None:
+            self.cache.count('revalidated')
+            self.cache.touch(key, meta)
+            return self.build_response(request, meta, body)
+
+        self.cache.count('miss')
+        headers = response.headers
+        if response.status_code == 200 and ('ETag' in headers or 'Last-Modified' in headers
+                                            or self.cache.ttl(request.url) > 0):
+            self.cache.store(key, response)
+        return response
+
+    def build_response(self, request, meta, body):
+        import requests
+        from requests.structures import CaseInsensitiveDict
+        response = requests.Response()
+        response.status_code = meta['status_code']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response._content = body
+        response.url = request.url
+        response.request = request
+        response.reason = 'OK'
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.connection = self
+        return response
+
+    def close(self):
+        self.adapter.close()
@@ -0,0 +1,188 @@
+import contextlib
+import cProfile
+import json
+import os
+import threading
+import time
+
+
+# Statuses GitLab answers before python-gitlab sends the same request again
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+# Wall time, API calls, response bytes and retries of a grading run, per student and stage.
+# Each thread keeps its own student and stage stack, so concurrent workers are attributed
+# correctly; API traffic is counted against the innermost stage
+class RunStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.records = {}
+        self.spans = None
+        self.started = time.time()
+
+    def reset(self):
+        with self.lock:
+            self.records = {}
+            self.spans = [] if self.spans is not None else None
+            self.started = time.time()
+
+    def record(self, student, stage, wall=0.0, calls=0, api_calls=0, bytes_read=0, retries=0):
+        with self.lock:
+            entry = self.records.setdefault((student, stage), {
+                'calls': 0, 'wall': 0.0, 'api_calls': 0, 'bytes': 0, 'retries': 0})
+            entry['calls'] += calls
+            entry['wall'] += wall
+            entry['api_calls'] += api_calls
+            entry['bytes'] += bytes_read
+            entry['retries'] += retries
+
+    def current(self):
+        stack = getattr(self.local, 'stages', None)
+        return getattr(self.local, 'student', None), stack[-1] if stack else None
+
+    @contextlib.contextmanager
+    def student(self, name):
+        previous = getattr(self.local, 'student', None)
+        self.local.student = name
+        try:
+            with self.stage('total'):
+                yield
+        finally:
+            self.local.student = previous
+
+    # Time a stage; also usable as a function decorator. A stage entered again from inside
+    # itself (e.g. export called by sync) is only counted once
+    @contextlib.contextmanager
+    def stage(self, name):
+        stack = self.local.__dict__.setdefault('stages', [])
+        if stack and stack[-1] == name:
+            yield
+            return
+        stack.append(name)
+        start = time.time()
+        try:
+            yield
+        finally:
+            stack.pop()
+            wall = time.time() - start
+            student = getattr(self.local, 'student', None)
+            self.record(student, name, wall=wall, calls=1)
+            if self.spans is not None:
+                with self.lock:
+                    self.spans.append((name, student, threading.get_ident(), start, wall))
+
+    # Count one HTTP response; its body bytes are counted as they are read, by whichever
+    # stage of the same thread consumes them (streamed archives and traces included)
+    def count_response(self, response):
+        student, stage = self.current()
+        self.record(student, stage, api_calls=1, retries=int(response.status_code in RETRY_STATUSES))
+        raw = getattr(response, 'raw', None)
+        if raw is None or not hasattr(raw, 'stream'):
+            return
+        stream = raw.stream
+
+        # requests reads every body, streamed or not, through raw.stream()
+        def counting_stream(*args, **kwargs):
+            for chunk in stream(*args, **kwargs):
+                self.record(*self.current(), bytes_read=len(chunk))
+                yield chunk
+        raw.stream = counting_stream
+
+    # One row per stage summed over all students, plus one row per student. A student's wall time
+    # is its 'total' stage where one was recorded, else the sum of its stages
+    def summary(self):
+        with self.lock:
+            records = {key: dict(value) for key, value in self.records.items()}
+        stages, students = {}, {}
+        for (student, stage), entry in records.items():
+            row = stages.setdefault(stage, {'stage': stage, 'calls': 0, 'wall': 0.0, 'api_calls': 0, 'bytes': 0,
+                                            'retries': 0})
+            for field in ('calls', 'wall', 'api_calls', 'bytes', 'retries'):
+                row[field] += entry[field]
+            if student is not None:
+                row = students.setdefault(student, {'student': student, 'wall': 0.0, 'api_calls': 0, 'bytes': 0,
+                                                    'retries': 0})
+                row.setdefault('total', None)
+                if stage == 'total':
+                    row['total'] = entry['wall']
+                else:
+                    row['wall'] += entry['wall']
+                for field in ('api_calls', 'bytes', 'retries'):
+                    row[field] += entry[field]
+        for row in students.values():
+            total = row.pop('total')
+            if total is not None:
+                row['wall'] = total
+        return {
+            'elapsed': time.time() - self.started,
+            'stages': sorted(stages.values(), key=lambda row: -row['wall']),
+            'students': sorted(students.values(), key=lambda row: -row['wall']),
+        }
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    # Stage spans in the Chrome trace event format, viewable in chrome://tracing or Perfetto
+    def export_trace(self, path):
+        with self.lock:
+            spans = list(self.spans or [])
+        events = [{'name': name, 'cat': 'stage', 'ph': 'X', 'pid': os.getpid(), 'tid': thread,
+                   'ts': int((start - self.started) * 1e6), 'dur': int(wall * 1e6), 'args': {'student': student}}
+                  for name, student, thread, start, wall in spans]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events}, f)
+
+    def print_table(self, top_students=10):
+        summary = self.summary()
+        print(f"\n{'stage':<16} {'calls':>6} {'wall s':>9} {'mean s':>8} {'API calls':>10} {'MB':>9} {'retries':>8}")
+        for row in summary['stages']:
+            mean = row['wall'] / row['calls'] if row['calls'] else 0.0
+            print(f"{row['stage'] or '-':<16} {row['calls']:>6} {row['wall']:>9.2f} {mean:>8.2f} {row['api_calls']:>10} "
+                  f"{row['bytes'] / 2**20:>9.2f} {row['retries']:>8}")
+        if summary['students']:
+            print(f"\n{'slowest students':<16} {'wall s':>9} {'API calls':>10} {'MB':>9} {'retries':>8}")
+            for row in summary['students'][:top_students]:
+                print(f"{row['student']:<16} {row['wall']:>9.2f} {row['api_calls']:>10} {row['bytes'] / 2**20:>9.2f} "
+                      f"{row['retries']:>8}")
+        print(f"\nelapsed: {summary['elapsed']:.2f}s")
+
+
+# Statistics of the current process, shared by check_repo.py and cargo_runner.py
+STATS = RunStats()
+
+stage = STATS.stage
+student = STATS.student
+record = STATS.record
+
+
+# Function to add the reporting options shared by the command line tools
+def add_arguments(parser):
+    parser.add_argument('--stats', action='store_true', help="print wall time, API calls and bytes per stage and student")
+    parser.add_argument('--stats-json', metavar='PATH', help="write the per-stage and per-student statistics as JSON")
+    parser.add_argument('--trace', metavar='PATH', help="write a Chrome trace of every stage (chrome://tracing, Perfetto)")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="write cProfile statistics of the main thread, for 'python -m pstats' or snakeviz")
+
+# Context manager that runs a command line tool with the reporting asked for in args
+@contextlib.contextmanager
+def reporting(args):
+    if args.trace:
+        STATS.spans = []
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        yield STATS
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Wrote profile to {args.profile} (view with: python -m pstats {args.profile})")
+        if args.stats:
+            STATS.print_table()
+        if args.stats_json:
+            STATS.export_json(args.stats_json)
+        if args.trace:
+            STATS.export_trace(args.trace)
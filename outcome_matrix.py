@@ -0,0 +1,140 @@
+import argparse
+import json
+import math
+from array import array
+
+import results_store
+
+
+# Where per-test outcomes come from: the CI job trace and the local cargo test run
+SOURCES = ['ci', 'local']
+
+
+# Function to count the students in a mask
+def popcount(mask):
+    return bin(mask).count('1')
+
+# Function to list the students whose bits are set in a mask
+def students_in(mask, students):
+    selected = []
+    while mask:
+        lowest = mask & -mask
+        selected.append(students[lowest.bit_length() - 1])
+        mask ^= lowest
+    return selected
+
+
+# Student x test outcomes of one assignment. Each (source, test) column is a pair of integer
+# bitmasks over the students, one bit per student for 'passed' and one for 'failed', so class-wide
+# counts and CI/local comparisons are a few big-integer operations per test instead of a loop
+# over students. Durations are kept in one float array per column, NaN where none was reported
+class OutcomeMatrix:
+    def __init__(self, rows):
+        rows = list(rows)
+        self.students = sorted({row[1] for row in rows})
+        self.tests = sorted({row[2] for row in rows})
+        student_index = {student: index for index, student in enumerate(self.students)}
+        test_index = {test: index for index, test in enumerate(self.tests)}
+
+        self.passed = {source: [0] * len(self.tests) for source in SOURCES}
+        self.failed = {source: [0] * len(self.tests) for source in SOURCES}
+        self.seconds = {source: [array('d', [math.nan]) * len(self.students) for _ in self.tests]
+                        for source in SOURCES}
+        for source, student, test, outcome, seconds in rows:
+            column, row = test_index[test], student_index[student]
+            if outcome == 'ok':
+                self.passed[source][column] |= 1 << row
+            elif outcome == 'FAILED':
+                self.failed[source][column] |= 1 << row
+            if seconds is not None:
+                self.seconds[source][column][row] = seconds
+
+    @classmethod
+    def load(cls, assignment, db_path=results_store.RESULTS_DB):
+        return cls(tuple(row) for row in results_store.read_test_cases(assignment, db_path=db_path))
+
+    def ran(self, source, column):
+        return self.passed[source][column] | self.failed[source][column]
+
+    # Per test: how many students ran it, how many passed, and the pass rate
+    def pass_rates(self, source='ci'):
+        rates = []
+        for column, test in enumerate(self.tests):
+            ran = popcount(self.ran(source, column))
+            passed = popcount(self.passed[source][column])
+            if ran:
+                rates.append({'test': test, 'ran': ran, 'passed': passed, 'failed': ran - passed,
+                              'pass_rate': passed / ran})
+        return rates
+
+    # The tests failed by the most students
+    def most_failing(self, source='ci', limit=10):
+        rates = [rate for rate in self.pass_rates(source) if rate['failed']]
+        return sorted(rates, key=lambda rate: (-rate['failed'], rate['test']))[:limit]
+
+    # Mean reported duration per test, skipping students without one
+    def mean_seconds(self, source='ci'):
+        means = {}
+        for test, durations in zip(self.tests, self.seconds[source]):
+            reported = [seconds for seconds in durations if not math.isnan(seconds)]
+            if reported:
+                means[test] = math.fsum(reported) / len(reported)
+        return means
+
+    # Students with a test that passed in one source and failed in the other, e.g. code that
+    # only passes on the student's machine or depends on the CI environment
+    def disagreements(self, first='ci', second='local'):
+        by_student = {}
+        for column, test in enumerate(self.tests):
+            both = self.ran(first, column) & self.ran(second, column)
+            differ = (self.passed[first][column] ^ self.passed[second][column]) & both
+            for student in students_in(differ, self.students):
+                by_student.setdefault(student, []).append(test)
+        return by_student
+
+    # Outcomes of one student as {test: outcome}, '-' where the test did not run
+    def student_row(self, student, source='ci'):
+        bit = 1 << self.students.index(student)
+        row = {}
+        for column, test in enumerate(self.tests):
+            if self.passed[source][column] & bit:
+                row[test] = 'ok'
+            elif self.failed[source][column] & bit:
+                row[test] = 'FAILED'
+            else:
+                row[test] = '-'
+        return row
+
+
+# Function to print the most failing tests and the CI/local disagreements of an assignment
+def print_report(matrix, source='ci', limit=10):
+    print(f"{len(matrix.students)} student(s), {len(matrix.tests)} test(s)")
+    print(f"\nMost failing tests ({source}):")
+    print(f"{'test':<48} {'failed':>7} {'ran':>5} {'pass rate':>10}")
+    for rate in matrix.most_failing(source, limit=limit):
+        print(f"{rate['test']:<48} {rate['failed']:>7} {rate['ran']:>5} {rate['pass_rate']:>10.0%}")
+    disagreements = matrix.disagreements()
+    print(f"\nStudents whose CI and local results disagree: {len(disagreements)}")
+    for student, tests in sorted(disagreements.items()):
+        print(f"  {student}: {', '.join(tests)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Class-wide per-test results of an assignment.")
+    parser.add_argument('assignment', help="assignment, e.g. homework-3")
+    parser.add_argument('--db', default=results_store.RESULTS_DB, help="results database")
+    parser.add_argument('--source', choices=SOURCES, default='ci', help="rank tests by CI or local outcomes")
+    parser.add_argument('--top', type=int, default=10, help="number of failing tests to show")
+    parser.add_argument('--json', metavar='PATH', help="write pass rates, durations and disagreements as JSON")
+    args = parser.parse_args()
+
+    matrix = OutcomeMatrix.load(args.assignment, db_path=args.db)
+    print_report(matrix, source=args.source, limit=args.top)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({source: {'pass_rates': matrix.pass_rates(source), 'mean_seconds': matrix.mean_seconds(source)}
+                       for source in SOURCES} | {'disagreements': matrix.disagreements()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
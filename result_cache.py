@@ -0,0 +1,90 @@
+import disk_cache
+import hashlib
+import json
+import os
+import subprocess
+import time
+
+
+# On-disk cache of local test results, shared by every run and assignment
+RESULT_CACHE_DIR = '.result-cache'
+
+# Least recently used entries are evicted once the cache grows past this size
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Folders that do not change what `cargo test` does: build output and version control
+SKIPPED_DIRS = {'target', '.git'}
+
+
+# Function to hash every file of a submission by path and content, so that an identical tree
+# gets the same digest whichever student it belongs to and whenever it was downloaded
+def tree_digest(folder):
+    digest = hashlib.sha256()
+    for root, dirs, names in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if d not in SKIPPED_DIRS)
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, folder).replace(os.sep, '/').encode() + b'\0')
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+# Function to describe the Rust toolchain that builds the submissions, e.g. a rustc upgrade
+# between two runs must not reuse results of the old compiler
+def toolchain_version():
+    versions = []
+    for command in (['rustc', '-vV'], ['cargo', '-V']):
+        try:
+            versions.append(subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                           errors='replace').stdout.strip())
+        except OSError:
+            versions.append('')
+    return '\n'.join(versions)
+
+# Function to build the cache key of one submission: its tree, the grader's own test files (if any
+# are copied in or read from outside the tree), the toolchain and the settings a result depends on
+def submission_key(folder, toolchain, settings=(), grader_files=()):
+    digest = hashlib.sha256()
+    digest.update(tree_digest(folder).encode())
+    for path in sorted(grader_files):
+        if os.path.isdir(path):
+            digest.update(f'\0{path}\0{tree_digest(path)}'.encode())
+        else:
+            with open(path, 'rb') as f:
+                digest.update(f'\0{path}\0'.encode() + hashlib.sha256(f.read()).digest())
+    digest.update(f'\0{toolchain}\0{json.dumps(list(settings))}'.encode())
+    return digest.hexdigest()
+
+
+# Persistent test results, one '<key>.json' per distinct submission. Only outcomes that are final
+# for a tree are stored; timeouts and runner errors are run again next time
+class ResultCache:
+    def __init__(self, cache_dir=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.stats = {'hit': 0, 'miss': 0}
+        self.files = disk_cache.LruDirectory(cache_dir, '.json', max_bytes)
+
+    def path(self, key):
+        return self.files.path(key)
+
+    # The stored result of a key, or None; a hit also marks the entry as just used
+    def load(self, key):
+        try:
+            with open(self.path(key)) as f:
+                result = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.stats['miss'] += 1
+            return None
+        self.files.touch(key)
+        self.stats['hit'] += 1
+        result['tests'] = [tuple(test) for test in result.get('tests', [])]
+        return result
+
+    def store(self, key, result):
+        entry = {field: value for field, value in result.items() if field != 'folder'}
+        entry['stored_at'] = time.time()
+        body = json.dumps(entry).encode()
+        temp_path = f'{self.path(key)}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(body)
+        if self.files.replace(temp_path, key):
+            self.files.evict()
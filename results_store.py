@@ -0,0 +1,258 @@
+import argparse
+import csv
+import json
+import sqlite3
+from datetime import datetime, timezone
+
+
+# Grades of every run, one row per (student, assignment, commit SHA)
+RESULTS_DB = 'results.db'
+
+# Columns besides the key that a run may fill in. CI and local test results are kept in
+# separate columns so that check_repo.py and cargo_runner.py can update the same row
+RESULT_COLUMNS = [
+    'repo_url',
+    'status',
+    'commit_count',
+    'missing_files',
+    'ci_total_tests',
+    'ci_passed_tests',
+    'ci_failed_tests',
+    'local_status',
+    'local_total_tests',
+    'local_passed_tests',
+    'local_failed_tests',
+    'error',
+]
+
+# Stages of grading one student, in order. The run journal records each one as it completes,
+# so that a resumed run only redoes the students and stages that did not finish
+STAGES = ['metadata', 'download', 'ci', 'local-test']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    student TEXT NOT NULL,
+    assignment TEXT NOT NULL,
+    commit_sha TEXT NOT NULL DEFAULT '',
+    repo_url TEXT,
+    status TEXT,
+    commit_count INTEGER,
+    missing_files TEXT,
+    ci_total_tests INTEGER,
+    ci_passed_tests INTEGER,
+    ci_failed_tests INTEGER,
+    local_status TEXT,
+    local_total_tests INTEGER,
+    local_passed_tests INTEGER,
+    local_failed_tests INTEGER,
+    error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (student, assignment, commit_sha)
+);
+CREATE INDEX IF NOT EXISTS results_by_assignment ON results (assignment, student, updated_at);
+CREATE TABLE IF NOT EXISTS journal (
+    student TEXT NOT NULL,
+    assignment TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    commit_sha TEXT NOT NULL DEFAULT '',
+    error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (student, assignment, stage)
+);
+CREATE TABLE IF NOT EXISTS test_cases (
+    student TEXT NOT NULL,
+    assignment TEXT NOT NULL,
+    source TEXT NOT NULL,
+    test TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    seconds REAL,
+    commit_sha TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (assignment, source, student, test)
+);
+'''
+
+
+# Function to open the results database, creating the schema on first use. WAL mode lets
+# concurrent graders write while the grade table is being read
+def connect(db_path=RESULTS_DB):
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+# Function to insert or update the row of one student, assignment and commit. Only the given
+# fields are written, so repeated runs update the row instead of adding another one
+def upsert_result(student, assignment, commit_sha=None, db_path=RESULTS_DB, **fields):
+    unknown = set(fields) - set(RESULT_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown result fields: {', '.join(sorted(unknown))}")
+    if isinstance(fields.get('missing_files'), (list, tuple)):
+        fields['missing_files'] = json.dumps(list(fields['missing_files']))
+
+    columns = ['student', 'assignment', 'commit_sha', *fields, 'updated_at']
+    values = [student, assignment, commit_sha or '', *fields.values(), datetime.now(timezone.utc).isoformat()]
+    updates = ', '.join(f'{column} = excluded.{column}' for column in [*fields, 'updated_at'])
+    connection = connect(db_path)
+    try:
+        with connection:
+            connection.execute(
+                f"INSERT INTO results ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT (student, assignment, commit_sha) DO UPDATE SET {updates}",
+                values)
+    finally:
+        connection.close()
+
+# Function to record that a stage of a student's run completed ('done') or broke off ('failed')
+def record_stage(student, assignment, stage, status='done', commit_sha=None, error=None, db_path=RESULTS_DB):
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage: {stage}")
+    connection = connect(db_path)
+    try:
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO journal (student, assignment, stage, status, commit_sha, error, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (student, assignment, stage, status, commit_sha or '', error, datetime.now(timezone.utc).isoformat()))
+    finally:
+        connection.close()
+
+# Function to forget the recorded stages of a student before they are run again, so that a run
+# that breaks off part way never leaves the entries of an older run looking complete
+def clear_stages(student, assignment, stages, db_path=RESULTS_DB):
+    connection = connect(db_path)
+    try:
+        with connection:
+            connection.execute(
+                f"DELETE FROM journal WHERE student = ? AND assignment = ? AND stage IN ({', '.join('?' * len(stages))})",
+                (student, assignment, *stages))
+    finally:
+        connection.close()
+
+# Function to read the run journal of an assignment as {student: {stage: entry}}
+def read_journal(assignment, db_path=RESULTS_DB):
+    connection = connect(db_path)
+    try:
+        rows = connection.execute('SELECT * FROM journal WHERE assignment = ?', (assignment,)).fetchall()
+    finally:
+        connection.close()
+
+    journal = {}
+    for row in rows:
+        journal.setdefault(row['student'], {})[row['stage']] = dict(row)
+    return journal
+
+# Function to list the students whose given stages are all recorded as done
+def completed_students(assignment, stages, db_path=RESULTS_DB):
+    journal = read_journal(assignment, db_path=db_path)
+    return {student for student, entries in journal.items()
+            if all(entries.get(stage, {}).get('status') == 'done' for stage in stages)}
+
+# Outcomes of one test case, worst first: a name reported twice (e.g. by two test binaries) keeps the worst
+TEST_OUTCOMES = ['FAILED', 'ok', 'ignored']
+
+# Function to replace the per-test outcomes of a student from one source ('ci' or 'local') with
+# the (name, outcome, seconds) tuples of the latest run
+def record_test_cases(student, assignment, source, tests, commit_sha=None, db_path=RESULTS_DB):
+    cases = {}
+    for name, outcome, seconds in tests:
+        if name not in cases or TEST_OUTCOMES.index(outcome) < TEST_OUTCOMES.index(cases[name][0]):
+            cases[name] = (outcome, seconds)
+    connection = connect(db_path)
+    try:
+        with connection:
+            connection.execute('DELETE FROM test_cases WHERE assignment = ? AND source = ? AND student = ?',
+                               (assignment, source, student))
+            connection.executemany(
+                'INSERT INTO test_cases (student, assignment, source, test, outcome, seconds, commit_sha) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(student, assignment, source, name, outcome, seconds, commit_sha or '')
+                 for name, (outcome, seconds) in cases.items()])
+    finally:
+        connection.close()
+
+# Function to read every per-test outcome of an assignment as (source, student, test, outcome, seconds) rows
+def read_test_cases(assignment, db_path=RESULTS_DB):
+    connection = connect(db_path)
+    try:
+        return connection.execute(
+            'SELECT source, student, test, outcome, seconds FROM test_cases WHERE assignment = ?',
+            (assignment,)).fetchall()
+    finally:
+        connection.close()
+
+# Function to build the roster-wide grade table of an assignment: one row per student, read
+# from that student's most recently updated row. Rows are never merged, so CI and local results
+# always come from the same commit and a cleared error stays cleared
+def grade_table(assignment, db_path=RESULTS_DB):
+    connection = connect(db_path)
+    try:
+        rows = connection.execute(
+            'SELECT * FROM results WHERE assignment = ? ORDER BY student, updated_at', (assignment,)).fetchall()
+    finally:
+        connection.close()
+
+    table = {}
+    for row in rows:
+        # Later rows replace earlier ones; fields a run never reported are left out
+        entry = {'student': row['student'], 'assignment': assignment}
+        for column in ['commit_sha', *RESULT_COLUMNS, 'updated_at']:
+            if row[column] not in (None, ''):
+                entry[column] = row[column]
+        entry['error'] = row['error'] or ''
+        table[row['student']] = entry
+    return list(table.values())
+
+# Function to write a grade table to CSV with a fixed column order
+def export_csv(table, path):
+    fieldnames = ['student', 'assignment', 'commit_sha', *RESULT_COLUMNS, 'updated_at']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in table:
+            writer.writerow(row)
+
+# Function to print a grade table, one line per student
+def print_grade_table(table):
+    print(f"{'student':<12} {'commit':<10} {'commits':>7} {'CI tests':>10} {'local tests':>12}  status")
+    for row in table:
+        ci = f"{row.get('ci_passed_tests', '-')}/{row.get('ci_total_tests', '-')}"
+        local = f"{row.get('local_passed_tests', '-')}/{row.get('local_total_tests', '-')}"
+        print(f"{row['student']:<12} {row.get('commit_sha', '')[:8]:<10} {row.get('commit_count', '-'):>7} "
+              f"{ci:>10} {local:>12}  {row.get('status', '-')}")
+
+
+# Function to print the run journal, one line per student with the status of every stage
+def print_journal(journal):
+    print(f"{'student':<12} " + ' '.join(f'{stage:<10}' for stage in STAGES))
+    for student in sorted(journal):
+        entries = journal[student]
+        print(f"{student:<12} " + ' '.join(f"{entries.get(stage, {}).get('status', '-'):<10}" for stage in STAGES))
+        for stage in STAGES:
+            if entries.get(stage, {}).get('error'):
+                print(f"  {stage}: {entries[stage]['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the grade table of an assignment.")
+    parser.add_argument('assignment', help="assignment, e.g. homework-3")
+    parser.add_argument('--db', default=RESULTS_DB, help="results database")
+    parser.add_argument('--csv', metavar='PATH', help="write the table to a CSV file instead of printing it")
+    parser.add_argument('--journal', action='store_true', help="show which grading stages completed for each student")
+    args = parser.parse_args()
+
+    if args.journal:
+        print_journal(read_journal(args.assignment, db_path=args.db))
+        return
+
+    table = grade_table(args.assignment, db_path=args.db)
+    if args.csv:
+        export_csv(table, args.csv)
+        print(f"Wrote {len(table)} student(s) to {args.csv}")
+    else:
+        print_grade_table(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict
+from itertools import combinations
+
+
+# Token k-grams that make up a submission's fingerprint
+SHINGLE_SIZE = 5
+
+# MinHash signature length, split into LSH bands. A pair with Jaccard similarity s shares at least
+# one band with probability 1 - (1 - s**4)**32: about 0.87 at s = 0.5, 0.23 at s = 0.3, 0.01 at s = 0.15
+SIGNATURE_SIZE = 128
+LSH_BANDS = 32
+LSH_ROWS = SIGNATURE_SIZE // LSH_BANDS
+
+# Pairs whose estimated similarity reaches this are reported
+SIMILARITY_THRESHOLD = 0.5
+
+# Signatures of an assignment are kept next to its downloads, e.g. repo/homework-3/similarity-index.json
+SIMILARITY_INDEX_NAME = 'similarity-index.json'
+
+# Folders never read: build output and version control
+SKIPPED_DIRS = {'target', '.git'}
+
+RUST_KEYWORDS = {
+    'as', 'async', 'await', 'break', 'const', 'continue', 'crate', 'dyn', 'else', 'enum', 'extern', 'false', 'fn',
+    'for', 'if', 'impl', 'in', 'let', 'loop', 'match', 'mod', 'move', 'mut', 'pub', 'ref', 'return', 'self', 'Self',
+    'static', 'struct', 'super', 'trait', 'true', 'type', 'unsafe', 'use', 'where', 'while',
+}
+
+# Comments and whitespace are dropped; literals and identifiers collapse to one token each, so
+# renaming variables or rewording strings does not change the token stream
+TOKEN_PATTERN = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>b?r(?P<hashes>\#*)".*?"(?P=hashes)|b?"(?:\\.|[^"\\])*")
+  | (?P<char>b?'(?:\\.|[^'\\\n])')
+  | (?P<number>\d[\w.]*)
+  | (?P<word>[A-Za-z_]\w*!?)
+  | (?P<punct>::|->|=>|==|!=|<=|>=|&&|\|\||\.\.=?|[^\s\w])
+""", re.VERBOSE | re.DOTALL)
+
+
+# Function to turn Rust source into normalized tokens
+def tokenize(source):
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(source):
+        kind = match.lastgroup
+        if kind == 'comment':
+            continue
+        if kind in ('string', 'hashes', 'char'):
+            tokens.append('"')
+        elif kind == 'number':
+            tokens.append('0')
+        elif kind == 'word':
+            word = match.group('word')
+            tokens.append(word if word in RUST_KEYWORDS or word.endswith('!') else 'x')
+        else:
+            tokens.append(match.group(kind))
+    return tokens
+
+# Function to hash every k-gram of a token stream to a 64-bit integer
+def shingles(tokens, size=SHINGLE_SIZE):
+    return {int.from_bytes(hashlib.blake2b('\x1f'.join(tokens[i:i + size]).encode(), digest_size=8).digest(), 'big')
+            for i in range(max(len(tokens) - size + 1, 0))}
+
+# Function to list the Rust sources of a submission folder, relative paths in a stable order
+def source_files(folder):
+    files = []
+    for root, dirs, names in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if d not in SKIPPED_DIRS and not d.startswith('.'))
+        for name in sorted(names):
+            if name.endswith('.rs'):
+                files.append(os.path.relpath(os.path.join(root, name), folder))
+    return files
+
+# Function to summarize the sources of a folder by path, size and modification time, so unchanged
+# submissions are recognized without reading them
+def folder_digest(folder):
+    digest = hashlib.sha256()
+    for path in source_files(folder):
+        stat = os.stat(os.path.join(folder, path))
+        digest.update(f'{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()
+
+# Function to collect the shingles of every Rust source in a folder
+def folder_shingles(folder):
+    tokens = []
+    for path in source_files(folder):
+        with open(os.path.join(folder, path), encoding='utf-8', errors='replace') as f:
+            tokens.extend(tokenize(f.read()))
+    return shingles(tokens)
+
+# Function to compute the MinHash signature of a shingle set with one-permutation hashing: the
+# (already uniform) shingle hashes are split into SIGNATURE_SIZE bins by their low bits and each
+# bin keeps its minimum, one pass instead of one pass per permutation. Empty bins borrow the value
+# of the next non-empty bin, shifted by the distance, so they stay comparable between submissions
+def minhash(shingle_set):
+    if not shingle_set:
+        return None
+    empty = 1 << 64
+    bins = [empty] * SIGNATURE_SIZE
+    for value in shingle_set:
+        index, rest = value % SIGNATURE_SIZE, value // SIGNATURE_SIZE
+        if rest < bins[index]:
+            bins[index] = rest
+    signature = list(bins)
+    for index in range(SIGNATURE_SIZE):
+        distance = 1
+        while signature[index] == empty:
+            borrowed = bins[(index + distance) % SIGNATURE_SIZE]
+            if borrowed != empty:
+                signature[index] = borrowed + distance * empty
+            distance += 1
+    return signature
+
+# Function to estimate the Jaccard similarity of two signatures
+def estimate_similarity(first, second):
+    return sum(1 for x, y in zip(first, second) if x == y) / SIGNATURE_SIZE
+
+
+# Persistent MinHash signatures of one assignment. Updating re-signs only the submissions whose
+# sources changed since the last run; similar pairs are found by LSH banding, so only students
+# who share a band are compared and the work grows with the roster rather than its square
+class SimilarityIndex:
+    def __init__(self, path, template=None):
+        self.path = path
+        self.template = template
+        self.template_shingles = folder_shingles(template) if template else set()
+        self.template_digest = folder_digest(template) if template else None
+        self.students = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            # Signatures made with other parameters or starter code are not comparable
+            if data.get('params') == self.params() and data.get('template') == self.template_digest:
+                self.students = data['students']
+
+    @classmethod
+    def for_assignment(cls, assignment, base_dir='repo', template=None):
+        return cls(os.path.join(base_dir, assignment, SIMILARITY_INDEX_NAME), template=template)
+
+    @staticmethod
+    def params():
+        return [SHINGLE_SIZE, SIGNATURE_SIZE]
+
+    # Sign one submission unless its sources are unchanged; returns True when it was (re)signed
+    def add(self, student, folder):
+        digest = folder_digest(folder)
+        entry = self.students.get(student)
+        if entry is not None and entry['digest'] == digest:
+            return False
+        # Starter code every student received is not evidence of copying
+        shingle_set = folder_shingles(folder) - self.template_shingles
+        self.students[student] = {'digest': digest, 'shingles': len(shingle_set), 'signature': minhash(shingle_set)}
+        return True
+
+    def remove(self, student):
+        self.students.pop(student, None)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'params': self.params(), 'template': self.template_digest, 'students': self.students}, f)
+        os.replace(temp_path, self.path)
+
+    # Pairs of students that share an LSH band, the only pairs whose similarity is estimated
+    def candidate_pairs(self):
+        buckets = defaultdict(list)
+        for student, entry in self.students.items():
+            signature = entry['signature']
+            if signature is None:
+                continue
+            for band in range(LSH_BANDS):
+                buckets[(band, *signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])].append(student)
+        candidates = set()
+        for members in buckets.values():
+            if len(members) > 1:
+                candidates.update(combinations(sorted(members), 2))
+        return candidates
+
+    # (student, student, estimated similarity) of likely similar pairs, most similar first
+    def similar_pairs(self, threshold=SIMILARITY_THRESHOLD):
+        pairs = []
+        for first, second in self.candidate_pairs():
+            similarity = estimate_similarity(self.students[first]['signature'], self.students[second]['signature'])
+            if similarity >= threshold:
+                pairs.append((first, second, similarity))
+        return sorted(pairs, key=lambda pair: (-pair[2], pair[0], pair[1]))
+
+
+# Function to bring the index of an assignment up to date with the downloaded submissions
+def update_index(assignment, participants, base_dir='repo', template=None):
+    index = SimilarityIndex.for_assignment(assignment, base_dir=base_dir, template=template)
+    updated = 0
+    for people in participants:
+        folder = os.path.join(base_dir, assignment, f'{people}-cse262', assignment)
+        if os.path.isdir(folder):
+            updated += index.add(people, folder)
+        else:
+            index.remove(people)
+    index.save()
+    print(f"Similarity index of {assignment}: {len(index.students)} submission(s), {updated} (re)signed")
+    return index
+
+# Function to print likely similar pairs
+def print_pairs(pairs):
+    if not pairs:
+        print("No similar pairs found.")
+        return
+    print(f"{'student':<16} {'student':<16} {'similarity':>10}")
+    for first, second, similarity in pairs:
+        print(f"{first:<16} {second:<16} {similarity:>10.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find likely similar submissions of an assignment.")
+    parser.add_argument('assignment', help="assignment folder under repo/, e.g. homework-3")
+    parser.add_argument('--participants', default='participants.txt', help="participants file, one username per line")
+    parser.add_argument('--template', metavar='DIR', help="starter code whose tokens are ignored")
+    parser.add_argument('--threshold', type=float, default=SIMILARITY_THRESHOLD,
+                        help="minimum estimated similarity to report (0-1)")
+    parser.add_argument('--json', metavar='PATH', help="also write the pairs as JSON")
+    args = parser.parse_args()
+
+    with open(args.participants) as f:
+        participants = [line.strip() for line in f if line.strip()]
+    index = update_index(args.assignment, participants, template=args.template)
+    pairs = index.similar_pairs(threshold=args.threshold)
+    print_pairs(pairs)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([{'students': [first, second], 'similarity': similarity} for first, second, similarity in pairs],
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import check_repo
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason='git is not installed')
+
+GIT_ENV = {
+    'GIT_AUTHOR_NAME': 'Student', 'GIT_AUTHOR_EMAIL': 'student@example.com',
+    'GIT_COMMITTER_NAME': 'Student', 'GIT_COMMITTER_EMAIL': 'student@example.com',
+    'GIT_CONFIG_NOSYSTEM': '1', 'HOME': os.devnull,
+}
+
+
+def git(cwd, *args):
+    env = {**os.environ, **GIT_ENV}
+    return subprocess.run(['git', *args], cwd=cwd, env=env, check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout.decode().strip()
+
+
+def write(root, path, text):
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def commit(work, message):
+    git(work, 'add', '-A')
+    git(work, 'commit', '--quiet', '-m', message)
+    return git(work, 'rev-parse', 'HEAD')
+
+
+@pytest.fixture
+def student_repo(tmp_path):
+    work = str(tmp_path / 'work')
+    os.makedirs(work)
+    git(work, 'init', '--quiet', '--initial-branch=main')
+    write(work, 'Cargo.toml', '[package]\nname = "hw"\n')
+    write(work, 'src/lib.rs', 'pub fn answer() -> u32 { 42 }\n')
+    write(work, 'tests/old.rs', '#[test]\nfn old() {}\n')
+    first = commit(work, 'Initial commit')
+    return work, first
+
+
+@pytest.fixture
+def backend(tmp_path, student_repo):
+    work, _ = student_repo
+    backend = check_repo.GitMirrorBackend(work, str(tmp_path / 'mirrors' / 'hw.git'), name='student/hw')
+    backend.fetch()
+    return backend
+
+
+def test_list_commits_uses_gitlab_date_format(backend, student_repo):
+    work, first = student_repo
+    write(work, 'src/lib.rs', 'pub fn answer() -> u32 { 43 }\n')
+    second = commit(work, 'Fix answer')
+    backend.fetch()
+
+    commits = backend.list_commits('main')
+    assert [c.id for c in commits] == [second, first]
+    for c in commits:
+        assert check_repo.parse_commit_date(c.created_at).tzinfo is not None
+    assert commits[0].message.strip() == 'Fix answer'
+
+
+def test_list_tree_recursive(backend):
+    top = {item['path']: item['type'] for item in backend.list_tree('main')}
+    assert top == {'Cargo.toml': 'blob', 'src': 'tree', 'tests': 'tree'}
+
+    tree = {item['path']: item['type'] for item in backend.list_tree('main', recursive=True)}
+    assert tree['src'] == 'tree'
+    assert tree['src/lib.rs'] == 'blob'
+    assert tree['tests/old.rs'] == 'blob'
+
+
+def test_apply_changes_removes_deleted_files(tmp_path, backend, student_repo):
+    work, first = student_repo
+    local_dir = str(tmp_path / 'submission')
+    assert backend.export(first, local_dir)
+    assert os.path.isfile(os.path.join(local_dir, 'tests', 'old.rs'))
+
+    git(work, 'rm', '--quiet', 'tests/old.rs')
+    write(work, 'tests/new.rs', '#[test]\nfn new() {}\n')
+    second = commit(work, 'Replace test')
+    backend.fetch()
+
+    assert backend.apply_changes(first, second, local_dir)
+    assert not os.path.exists(os.path.join(local_dir, 'tests', 'old.rs'))
+    with open(os.path.join(local_dir, 'tests', 'new.rs')) as f:
+        assert f.read() == '#[test]\nfn new() {}\n'
+
+
+def test_sync_submission_skips_unchanged_head(tmp_path, backend, student_repo, monkeypatch):
+    _, first = student_repo
+    local_dir = str(tmp_path / 'submission')
+    manifest_path = str(tmp_path / 'manifest.json')
+    assert check_repo.sync_submission(backend, 'main', local_dir, head_sha=first, manifest_path=manifest_path)
+    assert check_repo.load_manifest(manifest_path)['student/hw@main']['sha'] == first
+
+    def fail(*args, **kwargs):
+        raise AssertionError('an unchanged head must not be downloaded again')
+
+    monkeypatch.setattr(backend, 'export', fail)
+    monkeypatch.setattr(backend, 'apply_changes', fail)
+    assert check_repo.sync_submission(backend, 'main', local_dir, head_sha=first, manifest_path=manifest_path)
+
+
+def test_sync_submission_exports_after_force_push(tmp_path, backend, student_repo):
+    work, first = student_repo
+    local_dir = str(tmp_path / 'submission')
+    manifest_path = str(tmp_path / 'manifest.json')
+    assert check_repo.sync_submission(backend, 'main', local_dir, head_sha=first, manifest_path=manifest_path)
+
+    # Amending the only commit leaves the downloaded commit off the new history
+    git(work, 'rm', '--quiet', 'tests/old.rs')
+    git(work, 'commit', '--quiet', '--amend', '-m', 'Initial commit without the old test')
+    amended = git(work, 'rev-parse', 'HEAD')
+    backend.fetch()
+
+    assert not backend.apply_changes(first, amended, local_dir)
+    assert check_repo.sync_submission(backend, 'main', local_dir, head_sha=amended, manifest_path=manifest_path)
+    assert not os.path.exists(os.path.join(local_dir, 'tests', 'old.rs'))
+    assert check_repo.load_manifest(manifest_path)['student/hw@main']['sha'] == amended
+
+
+def test_full_download_records_manifest(tmp_path, backend, student_repo):
+    work, first = student_repo
+    local_dir = str(tmp_path / 'submission')
+    manifest_path = str(tmp_path / 'manifest.json')
+    assert check_repo.sync_submission(backend, 'main', local_dir, head_sha=first, manifest_path=manifest_path)
+
+    write(work, 'src/lib.rs', 'pub fn answer() -> u32 { 43 }\n')
+    second = commit(work, 'Fix answer')
+    backend.fetch()
+
+    assert check_repo.sync_submission(backend, 'main', local_dir, manifest_path=manifest_path, incremental=False)
+    assert check_repo.load_manifest(manifest_path)['student/hw@main']['sha'] == second
+    with open(os.path.join(local_dir, 'src', 'lib.rs')) as f:
+        assert '43' in f.read()
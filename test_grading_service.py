@@ -0,0 +1,155 @@
+import sys
+import threading
+import time
+
+import pytest
+
+gitlab = pytest.importorskip('gitlab')
+
+import check_repo
+import fake_gitlab
+import grading_service
+
+ASSIGNMENT = 'homework-2'
+SECRET = 'webhook-secret'
+
+
+@pytest.fixture
+def server():
+    server = fake_gitlab.FakeGitLab(['alice', 'bob', 'carol'], ASSIGNMENT, files=3, commits=3, trace_kb=1)
+    url = server.start()
+    server.gl = gitlab.Gitlab(url, private_token='token')
+    yield server
+    server.stop()
+
+
+# Replaces check_repo.grade_student with a stub that records every (student, assignment) it grades
+@pytest.fixture
+def graded(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def grade_student(gl, people, assignment, **options):
+        with lock:
+            calls.append((people, assignment))
+        return {'username': people, 'status': 'ok', 'commit_count': 3, 'passed_tests': 1, 'total_tests': 1}
+
+    monkeypatch.setattr(check_repo, 'grade_student', grade_student)
+    return calls
+
+
+@pytest.fixture
+def service(server, graded, tmp_path, monkeypatch):
+    # start() routes sys.stdout through ThreadOutput; monkeypatch puts the original back
+    monkeypatch.setattr(sys, 'stdout', sys.stdout)
+    roster = {('alice', ASSIGNMENT), ('bob', ASSIGNMENT)}
+    service = grading_service.GradingService(server.gl, roster, workers=2, secret=SECRET, delay=0.2,
+                                             poll_interval=0, state_path=str(tmp_path / 'state.json'))
+    service.url = service.start(port=0)
+    yield service
+    service.stop()
+
+
+def project(server, student):
+    return server.projects[f'{student}-cse262/{ASSIGNMENT}']
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_regrade_queue_merges_a_burst():
+    queue = grading_service.RegradeQueue(delay=0.1)
+    key = ('alice', ASSIGNMENT)
+    for reason in ['push 1', 'push 2', 'pipeline 3 success']:
+        queue.put(key, reason)
+    assert queue.get() == (key, ['push 1', 'push 2', 'pipeline 3 success'])
+    assert queue.status() == {'events': 3, 'merged': 2, 'graded': 0, 'pending': 0, 'running': 1}
+
+    # An event while the key is graded queues exactly one more run, after the first one is done
+    queue.put(key, 'push 4')
+    got = []
+    worker = threading.Thread(target=lambda: got.append(queue.get()))
+    worker.start()
+    time.sleep(0.2)
+    assert not got
+    queue.done(key)
+    worker.join(timeout=5)
+    assert got == [(key, ['push 4'])]
+
+
+def test_burst_of_pushes_is_graded_once(server, service, graded):
+    alice = project(server, 'alice')
+    for _ in range(3):
+        alice.push()
+        status, reply = fake_gitlab.send_webhook(service.url, 'Push Hook', alice.push_hook(server.url), token=SECRET)
+        assert status == 202 and reply['queued'] == ['alice', ASSIGNMENT]
+
+    assert wait_for(lambda: service.queue.status()['graded'] == 1)
+    assert graded == [('alice', ASSIGNMENT)]
+    assert service.queue.status()['merged'] == 2
+
+
+def test_ignores_other_branches_and_unfinished_pipelines(server, service, graded):
+    alice = project(server, 'alice')
+    status, reply = fake_gitlab.send_webhook(service.url, 'Push Hook',
+                                             alice.push_hook(server.url, ref='refs/heads/feature'), token=SECRET)
+    assert status == 200 and reply == {'ignored': 'push to feature, not the default branch'}
+
+    for pipeline_status in ['created', 'pending', 'running']:
+        status, reply = fake_gitlab.send_webhook(service.url, 'Pipeline Hook',
+                                                 alice.pipeline_hook(server.url, status=pipeline_status), token=SECRET)
+        assert status == 200 and reply == {'ignored': f'pipeline {pipeline_status}'}
+
+    status, reply = fake_gitlab.send_webhook(service.url, 'Pipeline Hook', alice.pipeline_hook(server.url), token=SECRET)
+    assert status == 202
+    assert wait_for(lambda: graded == [('alice', ASSIGNMENT)])
+    assert service.queue.status()['events'] == 1
+
+
+def test_rejects_students_not_on_the_roster(server, service, graded):
+    carol = project(server, 'carol')
+    status, reply = fake_gitlab.send_webhook(service.url, 'Push Hook', carol.push_hook(server.url), token=SECRET)
+    assert status == 200 and reply == {'ignored': f'carol {ASSIGNMENT} is not on the roster'}
+    assert service.queue.status()['events'] == 0
+
+
+def test_rejects_a_wrong_token(server, service, graded):
+    alice = project(server, 'alice')
+    for token in [None, 'wrong-secret']:
+        status, reply = fake_gitlab.send_webhook(service.url, 'Push Hook', alice.push_hook(server.url), token=token)
+        assert status == 401 and reply == {'error': 'invalid token'}
+    assert service.queue.status()['events'] == 0
+
+
+def test_poller_skips_activity_a_grade_has_seen(server, tmp_path):
+    roster = {('alice', ASSIGNMENT), ('bob', ASSIGNMENT)}
+    queue = grading_service.RegradeQueue(delay=0)
+    poller = grading_service.ActivityPoller(server.gl, roster, queue, state_path=str(tmp_path / 'state.json'))
+
+    # alice was graded (e.g. after a webhook) after her last activity, bob was not
+    queue.put(('alice', ASSIGNMENT), 'push')
+    key, _ = queue.get()
+    queue.done(key)
+
+    assert poller.poll() == 1
+    assert queue.get() == (('bob', ASSIGNMENT), [f"activity {project(server, 'bob').project_json('')['last_activity_at']}"])
+    queue.done(('bob', ASSIGNMENT))
+
+    # Nothing changed since the last poll; then a push newer than alice's last grade is picked up
+    assert poller.poll() == 0
+    # fake_gitlab stamps activity in whole seconds, so the push must land in a later second than the grade
+    time.sleep(1.1)
+    project(server, 'alice').push()
+    assert poller.poll() == 1
+    assert queue.get()[0] == ('alice', ASSIGNMENT)
+
+    # A restarted poller reads the saved state and does not queue the same activity again
+    restarted = grading_service.ActivityPoller(server.gl, roster, grading_service.RegradeQueue(delay=0),
+                                               state_path=str(tmp_path / 'state.json'))
+    assert restarted.poll() == 0
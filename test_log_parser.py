@@ -0,0 +1,137 @@
+from types import SimpleNamespace
+
+import check_repo
+
+# cargo test output of a crate with a unit test binary, a failing integration test binary and doc-tests
+MULTI_BINARY_LOG = '''\
+   Compiling grading v0.1.0 (/builds/student/homework-2)
+    Finished `test` profile [unoptimized + debuginfo] target(s) in 1.52s
+     Running unittests src/lib.rs (target/debug/deps/grading-0123456789abcdef)
+
+running 4 tests
+test tests::parses_numbers ... ok
+test tests::parses_strings ... ok
+test tests::parses_lists ... ok
+test tests::slow_case ... ignored
+
+test result: ok. 3 passed; 0 failed; 1 ignored; 0 measured; 0 filtered out; finished in 0.01s
+
+     Running tests/integration.rs (target/debug/deps/integration-fedcba9876543210)
+
+running 3 tests
+test évaluation_vide ... ok
+test nested_lists ... FAILED
+test unicode_strings ... FAILED
+
+failures:
+
+---- nested_lists stdout ----
+thread 'nested_lists' panicked at tests/integration.rs:12:5:
+assertion `left == right` failed
+
+failures:
+    nested_lists
+    unicode_strings
+
+test result: FAILED. 1 passed; 2 failed; 0 ignored; 0 measured; 0 filtered out; finished in 0.02s
+
+error: test failed, to rerun pass `--test integration`
+   Doc-tests grading
+
+running 1 test
+test src/lib.rs - parse (line 3) ... ok
+
+test result: ok. 1 passed; 0 failed; 0 ignored; 0 measured; 0 filtered out; finished in 0.10s
+
+'''
+
+
+def parse(chunks):
+    parser = check_repo.TestLogParser()
+    for chunk in chunks:
+        if parser.feed(chunk):
+            break
+    parser.close()
+    return parser
+
+
+def test_counts_every_binary_including_failed_ones():
+    parser = parse([MULTI_BINARY_LOG])
+    # Ignored tests are neither passed nor failed and are left out of the total
+    assert parser.totals() == (7, 5, 2)
+    assert parser.summaries == 3
+    assert ('nested_lists', 'FAILED', None) in parser.tests
+    assert ('tests::slow_case', 'ignored', None) in parser.tests
+
+
+def test_summaries_win_over_test_lines():
+    log = 'running 3 tests\ntest a ... ok\n\ntest result: FAILED. 1 passed; 2 failed; 0 ignored\n'
+    assert check_repo.analyze_test_results(log) == (3, 1, 2)
+
+
+def test_counts_test_lines_without_a_summary():
+    log = 'running 3 tests\ntest a ... ok\ntest b ... FAILED\n'
+    assert check_repo.analyze_test_results(log) == (2, 1, 1)
+
+
+def test_chunk_boundaries_do_not_change_the_result():
+    data = MULTI_BINARY_LOG.encode()
+    whole = parse([data])
+    # One byte at a time splits every line and the two-byte 'é' in the middle
+    split = parse(data[index:index + 1] for index in range(len(data)))
+    assert split.totals() == whole.totals()
+    assert split.tests == whole.tests
+    assert ('évaluation_vide', 'ok', None) in split.tests
+
+
+def test_reads_to_the_end_without_doc_tests():
+    log = MULTI_BINARY_LOG[:MULTI_BINARY_LOG.index('   Doc-tests')]
+    parser = check_repo.TestLogParser()
+    for line in log.splitlines(keepends=True):
+        assert not parser.feed(line)
+    parser.close()
+    assert parser.totals() == (6, 4, 2)
+
+
+def test_stops_after_the_doc_test_summary():
+    trailer = '\ntest result: ok. 99 passed; 0 failed; 0 ignored\n'.encode()
+    parser = check_repo.TestLogParser()
+    assert parser.feed(MULTI_BINARY_LOG.encode())
+    assert parser.feed(trailer)
+    parser.close()
+    assert parser.totals() == (7, 5, 2)
+    assert parser.bytes_read == len(MULTI_BINARY_LOG.encode())
+
+
+# A streamed trace response that records how much of the log was read and whether it was closed
+class FakeTraceResponse:
+    def __init__(self, data, chunk_size):
+        self.chunks = [data[index:index + chunk_size] for index in range(0, len(data), chunk_size)]
+        self.read = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def test_parse_job_trace_closes_the_response_early():
+    data = MULTI_BINARY_LOG.encode() + b'   Compiling never_read v0.1.0\n' * 1000
+    response = FakeTraceResponse(data, chunk_size=256)
+    requested = []
+
+    def http_get(path, **kwargs):
+        requested.append((path, kwargs))
+        return response
+
+    job = SimpleNamespace(encoded_id=1001, manager=SimpleNamespace(path='/projects/1/jobs',
+                                                                   gitlab=SimpleNamespace(http_get=http_get)))
+    parser = check_repo.parse_job_trace(job, chunk_size=256)
+    assert parser.totals() == (7, 5, 2)
+    assert requested == [('/projects/1/jobs/1001/trace', {'streamed': True, 'raw': True})]
+    assert response.closed
+    assert response.read < len(response.chunks)